@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""Times benchmarks, measures their allocations and compares baselines."""
+
+import json
+import time
+import tracemalloc
+
+
+class Benchmark:
+    """A function to be called repeatedly and timed.
+
+    Attributes:
+    name -- <str>; the name results are reported under
+    function -- <function>; called with no arguments once per operation
+    """
+
+    def __init__(self, name, function):
+        """Initializes values."""
+        self.name = name
+        self.function = function
+
+
+def ops_per_second(function, minTime=0.2, repeat=5):
+    """Returns the calls to <function> per second (<float>).
+
+    <function> is called in batches taking at least <minTime> seconds and
+    the fastest of <repeat> batches is used.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= minTime:
+            break
+        if elapsed == 0:
+            number *= 10
+        else:
+            number = max(number * 2, int(number * minTime / elapsed) + 1)
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return number / best
+
+
+def allocations(function, calls=100):
+    """Measures the memory <function> allocates.
+
+    Returns (<peak>, <retained>): the average bytes (<int>) in use at
+    the peak of a call and the average bytes still in use after a call.
+    """
+    tracemalloc.start()
+    try:
+        peak = 0
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(calls):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            function()
+            peak += tracemalloc.get_traced_memory()[1] - current
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return peak // calls, max(0, retained) // calls
+
+
+def run(benchmarks, minTime=0.2):
+    """Runs <benchmarks> (<list> of <Benchmark>s).
+
+    Returns {<name>: {"opsPerSec": <float>, "peakBytes": <int>,
+    "retainedBytes": <int>}}.
+    """
+    results = {}
+    for benchmark in benchmarks:
+        benchmark.function()  # Warm up caches and lazily loaded modules.
+        speed = ops_per_second(benchmark.function, minTime)
+        peak, retained = allocations(benchmark.function)
+        results[benchmark.name] = {"opsPerSec": round(speed, 1),
+                                   "peakBytes": peak,
+                                   "retainedBytes": retained}
+    return results
+
+
+def save(path, results):
+    """Saves <results> returned by <run> to <path> as a baseline."""
+    with open(path, "w") as f:
+        json.dump(results, f, indent = 4, sort_keys = True)
+        f.write("\n")
+
+
+def load(path):
+    """Returns the baseline saved in <path>."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Finds benchmarks which regressed compared to <baseline>.
+
+    A benchmark regressed if it's more than <tolerance> (e.g., 0.25 for
+    25%) slower or allocates that much more memory at its peak.
+
+    Returns {<name>: <str>} describing each regression.
+    """
+    regressions = {}
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        problems = []
+        if result["opsPerSec"] < old["opsPerSec"] * (1 - tolerance):
+            problems.append("{:.0%} slower".format(
+                1 - result["opsPerSec"] / old["opsPerSec"]))
+        if result["peakBytes"] > old["peakBytes"] * (1 + tolerance) + 64:
+            problems.append("{} more peak bytes".format(
+                result["peakBytes"] - old["peakBytes"]))
+        if problems:
+            regressions[name] = ", ".join(problems)
+    return regressions
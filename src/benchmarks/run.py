@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+"""Benchmarks the bots' message handling and text utilities.
+
+The bot runs in a temporary folder with a fake connection instead of
+<hclib> and only commands which don't use the network are called. Run
+it from the "src" folder (e.g., "python3 -m benchmarks.run"); "--help"
+lists every option.
+
+Results are compared to the baseline saved with "--save" (by default
+"benchmarks/baseline.json") and the exit code is 1 if any benchmark
+regressed. Baselines depend on the machine so they aren't committed.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from benchmarks import harness
+
+_defaultBaseline = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "baseline.json")
+
+
+class FakeConnection:
+    """Stands in for an <hclib.HackChat> connection, counting messages."""
+
+    def __init__(self, channel):
+        """Initializes values."""
+        self.channel = channel
+        self.nick = "benchbot"
+        self.sent = 0
+
+    def send(self, text):
+        self.sent += 1
+
+    def stats(self):
+        pass
+
+    def leave(self):
+        pass
+
+
+def make_bot(folder):
+    """Returns a <bot.HackChatBot> keeping its data in <folder>.
+
+    Replies are sent straight to the connection instead of being paced.
+    """
+    os.makedirs(os.path.join(folder, "data"), exist_ok = True)
+    os.chdir(folder)
+    with open(os.path.join("data", "config.json"), "w") as f:
+        json.dump({"name": "benchbot", "password": "", "channels": ["bench"],
+                   "trigger": ".", "url": "", "oxfordAppId": "",
+                   "oxfordAppKey": "", "exchangeRateApiKey": "",
+                   "github": "", "doNotLeave": [], "cache": {"path": None}},
+                  f)
+    import bot
+    import context
+    hackChatBot = bot.HackChatBot(connector = object())
+    hackChatBot._parser = context.Parser(hackChatBot._config["trigger"])
+    return hackChatBot
+
+
+def _message(nick, text, trip=None):
+    info = {"type": "message", "nick": nick, "text": text}
+    if trip:
+        info["trip"] = trip
+    return info
+
+
+def benchmarks(folder):
+    """Returns the <harness.Benchmark>s, with their data kept in <folder>."""
+    import formatting
+    import tripindex
+    import utility
+    from commands import arithmetic
+    from commands import katex
+    from commands import password
+    rng = random.Random(1)
+    hackChatBot = make_bot(folder)
+    store = hackChatBot._state
+    small = FakeConnection("small")
+    large = FakeConnection("large")
+    for index in range(10):
+        store.set_afk("small", "afk{}".format(index), "lunch")
+    for index in range(10000):
+        store.set_afk("large", "afk{}".format(index), "away for a while")
+    for index in range(100000):
+        store.log_trip_code("trip{}".format(index % 5000),
+                            "nick{}".format(index))
+    tripsPath = os.path.join(folder, "data", "bench-trips.idx")
+    tripindex.update(tripsPath, (("trip{}".format(index % 5000),
+                                  "nick{}".format(index))
+                                 for index in range(100000)), 100000)
+    trips = tripindex.TripIndex(tripsPath)
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur"]
+    longMessage = " ".join(rng.choice(words) for _ in range(1000))
+    poem = "\n".join(" ".join(rng.choice(words) for _ in range(7))
+                     for _ in range(200))
+    longPoem = "\n".join(poem for _ in range(50))
+    nicks = ["nick{}".format(index) for index in range(10000)]
+    chatter = _message("user1", "hey @afk3 and @afk9000 did you see that?",
+                       "trip42")
+    mention = hackChatBot._parser.parse(large, chatter)
+
+    def post():
+        for _ in range(3):
+            store.queue_message("reader", "writer", "see you tomorrow")
+        hackChatBot._post(hackChatBot._parser.parse(
+            small, _message("reader", "hi")))
+
+    def alias(text):
+        info = _message("user1", text)
+        return lambda: hackChatBot._handle(small, info)
+
+    sizes = ["tiny", "scriptsize", "footnotesize", "small", "normalsize",
+             "large", "Large", "LARGE", "huge", "Huge"]
+    katexText = "the quick brown fox jumps over the lazy dog " * 4
+    cases = [
+        ("handle.chatter.small_afk",
+         lambda: hackChatBot._handle(small, chatter)),
+        ("handle.chatter.large_afk",
+         lambda: hackChatBot._handle(large, chatter)),
+        ("handle.long_message",
+         lambda: hackChatBot._handle(small, _message("user1", longMessage))),
+        ("handle.command.toss",
+         lambda: hackChatBot._handle(small, _message("user1", ".toss"))),
+        ("handle.command.math",
+         lambda: hackChatBot._handle(small, _message("user1",
+                                                     ".math (3 + 4) ** 5"))),
+        ("handle.command.alias_trip", alias(".alias trip42")),
+        ("handle.command.alias_nick", alias(".alias nick4242")),
+        ("tripindex.aliases", lambda: trips.aliases("trip42")),
+        ("tripindex.trips", lambda: trips.trips("nick4242")),
+        ("tripindex.contains",
+         lambda: trips.contains("trip42", "nick99999")),
+        ("check_afk.large", lambda: hackChatBot._check_afk(mention)),
+        ("post.three_messages", post),
+        ("utility.shorten", lambda: utility.shorten(longMessage, 704, " ")),
+        ("utility.shorten_lines",
+         lambda: utility.shorten_lines(poem, 88, 7)),
+        ("formatting.long_poem",
+         lambda: formatting.truncate_lines(longPoem, 88, 7)),
+        ("formatting.many_aliases",
+         lambda: formatting.truncate(
+             formatting.joined("@user1 trip42 has the aliases ", nicks,
+                               ", "), 704, " ")),
+        ("utility.identical_item",
+         lambda: utility.identical_item(["katex", "rainbow", "Huge"], sizes)),
+        ("katex.generator",
+         lambda: katex.generator.__wrapped__(katexText, "huge", "rainbow",
+                                             "mathbb")),
+        ("katex.generator.cached",
+         lambda: katex.generator(katexText, "huge", "rainbow", "mathbb")),
+        ("password.strengthen",
+         lambda: password.strengthen("correcthorsebatterystaple")),
+        ("arithmetic.evaluate",
+         lambda: arithmetic.evaluate("(-2) ** 4 + 3 * (7 - 2) // 4 % 5")),
+        ("arithmetic.evaluate.large",
+         lambda: arithmetic.evaluate("2 ** 3000 // 3 ** 500 - 7 ** 900"))
+    ]
+    return [harness.Benchmark(name, function) for name, function in cases]
+
+
+def _print_results(results, baseline, regressions):
+    print("{:<28} {:>12} {:>12} {:>10} {:>10}".format(
+        "benchmark", "ops/sec", "peak B/op", "kept B/op", "change"))
+    for name, result in results.items():
+        change = ""
+        if name in baseline:
+            change = "{:+.1%}".format(
+                result["opsPerSec"] / baseline[name]["opsPerSec"] - 1)
+        print("{:<28} {:>12,.0f} {:>12,} {:>10,} {:>10}".format(
+            name, result["opsPerSec"], result["peakBytes"],
+            result["retainedBytes"], change))
+    for name, problem in regressions.items():
+        print("REGRESSION {}: {}".format(name, problem))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--filter", default = "",
+                        help = "only run benchmarks containing this")
+    parser.add_argument("--baseline", default = _defaultBaseline,
+                        help = "the baseline file to compare against")
+    parser.add_argument("--save", action = "store_true",
+                        help = "save the results as the baseline")
+    parser.add_argument("--tolerance", type = float, default = 0.25,
+                        help = "the slowdown counted as a regression")
+    parser.add_argument("--min-time", type = float, default = 0.2,
+                        help = "seconds each timing batch runs for")
+    parser.add_argument("--json", action = "store_true",
+                        help = "print the results as JSON")
+    args = parser.parse_args()
+    baselinePath = os.path.abspath(args.baseline)
+    folder = tempfile.mkdtemp(prefix = "hackchat-bench-")
+    cwd = os.getcwd()
+    try:
+        selected = [benchmark for benchmark in benchmarks(folder)
+                    if args.filter in benchmark.name]
+        results = harness.run(selected, args.min_time)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder, ignore_errors = True)
+    baseline = {}
+    if os.path.isfile(baselinePath) and not args.save:
+        baseline = harness.load(baselinePath)
+    regressions = harness.compare(results, baseline, args.tolerance)
+    if args.json:
+        print(json.dumps({"results": results, "regressions": regressions},
+                         indent = 4))
+    else:
+        _print_results(results, baseline, regressions)
+    if args.save:
+        harness.save(baselinePath, results)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,28 +3,58 @@
 """Connects the bot."""
 
 import datetime
+import functools
 import getpass
 import json
 import os.path
 import random
 import re
+import signal
 import sys
-import threading
 import time
 
-import cucco
-import hclib
-
+_importStart = time.perf_counter()  # Times the imports below.
+
+import cache
+import connections
+import context
+import formatting
+import httpclient
+import loader
+import metrics
+import outbound
+import registry
+import state
 import utility
-from commands import arithmetic
-from commands import currency
-from commands import jokes
-from commands import dictionary
-from commands import katex
-from commands import password
-from commands import paste
-from commands import poetry
-from commands import search
+import workers
+
+# Loaded on first use so disabled commands and unused engines cost nothing.
+hclib = loader.lazy("hclib")
+database = loader.lazy("database")
+engine = loader.lazy("engine")
+supervisor = loader.lazy("supervisor")
+arithmetic = loader.lazy("commands.arithmetic")
+currency = loader.lazy("commands.currency")
+jokes = loader.lazy("commands.jokes")
+dictionary = loader.lazy("commands.dictionary")
+katex = loader.lazy("commands.katex")
+password = loader.lazy("commands.password")
+paste = loader.lazy("commands.paste")
+poetry = loader.lazy("commands.poetry")
+search = loader.lazy("commands.search")
+loader.record("import modules", time.perf_counter() - _importStart)
+
+_events = metrics.histogram("hackchat_bot_event_seconds",
+                            "Seconds taken to handle events by type.",
+                            ("type",))
+_messages = metrics.counter("hackchat_bot_messages_total",
+                            "Messages received by channel.", ("channel",))
+_commandTimes = metrics.histogram("hackchat_bot_command_seconds",
+                                  "Seconds taken to run commands.",
+                                  ("command",))
+_rejected = metrics.counter("hackchat_bot_commands_rejected_total",
+                            "Commands turned away by the busy worker pool.",
+                            ("command",))
 
 
 class HackChatBot:
@@ -33,9 +63,17 @@ class HackChatBot:
     Use the <join> function to join channels.
     """
 
-    def __init__(self):
-        """Initializes values."""
-        random.seed(datetime.datetime.now())
+    def __init__(self, connector=None, store=None):
+        """Initializes values.
+
+        <connector> is an optional <connections.Manager> or
+        <engine.Engine> used to join and leave channels instead of
+        starting an <hclib.HackChat> connection for each.
+        <store> is an optional store shared with other bot processes
+        (see <supervisor>) used instead of opening one.
+        """
+        self._connector = connector
+        random.seed(datetime.datetime.now().timestamp())
         self._config = json.loads(open("data/config.json").read())
         if (not self._config["name"] or not self._config["channels"]
             or not self._config["trigger"]):
@@ -44,17 +82,49 @@ class HackChatBot:
         self._charsPerLine = 88
         self._maxLines = 8
         self._maxChars = self._charsPerLine * self._maxLines
-        self._commands = [
-            "afk", "alias", "h", "help", "join", "joke", "katex", "leave",
-            "math", "msg", "poem", "poet", "password", "search", "stats",
-            "toss", "urban"
-        ]
-        if self._config["oxfordAppId"] and self._config["oxfordAppKey"]:
-            self._commands += ["define", "translate"]
-        if self._config["exchangeRateApiKey"]:
-            self._commands.append("rate")
-        self._oxford = dictionary.Oxford(self._config["oxfordAppId"],
-                                         self._config["oxfordAppKey"])
+        self._oxford = None
+        with loader.timed("init state"):
+            if store is not None:
+                self._state = store
+            elif self._config.get("stateBackend") == "sqlite":
+                self._state = database.Database("data")
+                self._state.reset_afk()
+            else:
+                self._state = state.State(
+                    "data", self._config.get("flushInterval", 5),
+                    self._config.get("compactSize", 4194304))
+                self._state.reset_afk()
+        with loader.timed("init caches"):
+            httpclient.configure(self._config.get("http", {}))
+            cache.configure(self._config.get("cache", {}))
+        math = self._config.get("math", {})
+        arithmetic.when_loaded(lambda module: module.configure(math))
+        poems = {"index": self._config.get("poetryIndex")}
+        poetry.when_loaded(lambda module: module.configure(poems))
+        with loader.timed("init outbound and workers"):
+            pacing = self._config.get("outbound", {})
+            self._outbox = outbound.Scheduler(
+                pacing.get("rate", 1), pacing.get("burst", 3),
+                pacing.get("globalRate", 4), pacing.get("globalBurst", 8),
+                self._maxChars)
+            self._parser = context.Parser(self._config["trigger"],
+                                          self._outbox)
+            pool = self._config.get("workers", {})
+            self._pool = workers.Pool(
+                pool.get("threads", 8), pool.get("queueDepth", 32),
+                pool.get("timeout", 20), pool.get("limits"))
+        metrics.gauge("hackchat_bot_outbound_queue_depth",
+                      "Messages waiting to be sent.",
+                      function = lambda: {(): self._outbox.depth()})
+        if self._config.get("preload"):
+            loader.preload(registry.modules(self._config))
+
+    def _dictionary(self):
+        """Returns the <dictionary.Oxford> client, creating it if needed."""
+        if self._oxford is None:
+            self._oxford = dictionary.Oxford(self._config["oxfordAppId"],
+                                             self._config["oxfordAppKey"])
+        return self._oxford
 
     def _handle(self, hackChat, info):
         """Callback function for data sent from https://hack.chat.
@@ -62,180 +132,143 @@ class HackChatBot:
         <hackChat> (callback parameter) is the connection object.
         <info> (callback parameter) is the data sent.
         """
-        self._hackChat = hackChat
-        self._type = info["type"]
-        self._nick = info["nick"] if "nick" in info else None
-        self._text = info["text"].strip() if "text" in info else None
-        self._trip = info["trip"] if "trip" in info else None
-        self._channel = info["channel"] if "channel" in info else None
-        self._ip = info["ip"] if "ip" in info else None
-        self._warning = info["warning"] if "warning" in info else None
-        self._ips = info["IPs"] if "IPs" in info else None
-        self._channels = info["channels"] if "channels" in info else None
-        if self._type == "invite":
-            self.join(self._channel)
-        elif self._type == "message":
-            if self._nick != self._config["name"]:
-                self._check_afk()
-            self._post()
-            if self._trip:
-                self._log_trip_code()
-            space = re.search(r"\s", self._text)
-            self._msg = self._text[space.end():].strip() if space else None
-            call = self._text[:len(self._config["trigger"])]
-            if call == self._config["trigger"]:
-                check = space.start() if space else len(self._text)
-                self._cmd = self._text[len(self._config["trigger"]):check]
-                self._message()
-        elif self._type == "online add":
-            self._post()
-        elif self._type == "online remove":
-            afkUsers = json.loads(open("data/afk.json").read())
-            if self._nick in afkUsers:
-                afkUsers.pop(self._nick)
-                with open("data/afk.json", "w") as f:
-                    json.dump(afkUsers, f, indent = 4)
-        elif self._type == "stats":
-            self._stats()
-        elif self._type == "warn":
-            self._warn()
+        ctx = self._parser.parse(hackChat, info)
+        with _events.time(type = ctx.type):
+            if ctx.type == "invite":
+                self.join(info["channel"])
+            elif ctx.type == "message":
+                _messages.inc(channel = ctx.channel)
+                if ctx.nick != self._config["name"]:
+                    self._check_afk(ctx)
+                self._post(ctx)
+                if ctx.trip:
+                    self._log_trip_code(ctx)
+                if ctx.cmd is not None:
+                    self._message(ctx)
+            elif ctx.type == "online add":
+                self._post(ctx)
+            elif ctx.type == "online remove":
+                self._state.clear_afk(ctx.channel, ctx.nick)
+            elif ctx.type == "stats":
+                self._stats(ctx)
+            elif ctx.type == "warn":
+                self._warn(ctx)
 
     def join(self, channel):
         """Joins <channel> (<str>)."""
+        if self._connector:
+            self._connector.join(channel)
+            return
         connector = hclib.HackChat(
             self._handle, self._config["name"], channel,
             self._config["password"], self._config["url"])
 
-    def _check_afk(self):
+    def _check_afk(self, ctx):
         """Notifies AFK statuses."""
-        afkUsers = json.loads(open("data/afk.json").read())
-        if not self._hackChat.channel in afkUsers:
+        afkUsers = self._state.afk_among(ctx.channel,
+                                         (ctx.nick,) + ctx.mentions)
+        if not afkUsers:
             return
-        afkUsersChannel = afkUsers[self._hackChat.channel]
-        cmd = "{}afk".format(self._config["trigger"])
-        if self._nick in afkUsersChannel and not re.match(cmd, self._text):
-            afkUsersChannel.pop(self._nick)
-            with open("data/afk.json", "w") as f:
-                json.dump(afkUsers, f, indent = 4)
+        if (ctx.nick in afkUsers
+                and not (ctx.cmd or "").startswith("afk")):
+            afkUsers.pop(ctx.nick)
+            self._state.clear_afk(ctx.channel, ctx.nick)
         reply = ""
-        for user in afkUsersChannel:
-            person = " @{} ".format(user)
-            if person in " {} ".format(self._text):
-                reply += person.strip()
-                if afkUsersChannel[user]:
-                    reply += ": {}".format(afkUsersChannel[user])
+        for user in ctx.mentions:
+            if user in afkUsers:
+                reply += "@{}".format(user)
+                if afkUsers[user]:
+                    reply += ": {}".format(afkUsers[user])
                 reply += "\n"
         if reply:
-            self._hackChat.send("@{} AFK users:\n{}".format(self._nick, reply))
+            ctx.send("@{} AFK users:\n{}".format(ctx.nick, reply),
+                     outbound.NOTICE)
 
-    def _log_trip_code(self):
+    def _log_trip_code(self, ctx):
         """Logs nicknames along with their trip codes."""
-        verifiers = json.loads(open("data/trip_codes.json").read())
-        if self._trip in verifiers and self._nick not in verifiers[self._trip]:
-            verifiers[self._trip].append(self._nick)
-        elif self._trip not in verifiers:
-            verifiers[self._trip] = [self._nick]
-        with open("data/trip_codes.json", "w") as f:
-            json.dump(verifiers, f, indent = 4)
-
-    def _post(self):
+        self._state.log_trip_code(ctx.trip, ctx.nick)
+
+    def _post(self, ctx):
         """Sends messages saved for people."""
-        messages = json.loads(open("data/messages.json").read())
-        if self._nick in messages:
+        messages = self._state.pop_messages(ctx.nick)
+        if messages:
             reply = ""
-            for msg in messages[self._nick]:
+            for msg in messages:
                 reply += "@{}: {}\n".format(msg["sender"], msg["message"])
-            messages.pop(self._nick)
-            with open("data/messages.json", "w") as f:
-                json.dump(messages, f, indent = 4)
-            self._hackChat.send(
-                "@{} you have messages:\n{}".format(self._nick, reply))
+            ctx.send("@{} you have messages:\n{}".format(ctx.nick, reply),
+                     outbound.BULK)
 
-    def _stats(self):
+    def _stats(self, ctx):
         """Sends statistics."""
-        self._hackChat.send("There are {} unique IPs in ".format(self._ips)
-                            + "{} channels.".format(self._channels))
+        ctx.send("There are {} unique IPs in ".format(ctx.ips)
+                 + "{} channels.".format(ctx.channels))
 
-    def _warn(self):
+    def _warn(self, ctx):
         """Handles warnings."""
-        msg = utility.date_format("warning", self._warning)
+        msg = utility.date_format("warning", ctx.warning)
         print("\n{}".format(msg))
 
-    def _message(self):
-        """Redirects commands to their respective wrapper functions."""
-        if self._cmd == "afk":
-            self._afk()
-        elif self._cmd == "alias":
-            self._alias()
-        elif self._cmd == "define" and "define" in self._commands:
-            self._define()
-        elif (self._cmd == "h" and not self._msg) or self._cmd == "help":
-            self._help()
-        elif self._cmd == "join":
-            self._joiner()
-        elif self._cmd == "joke":
-            self._joke()
-        elif self._cmd[:len("katex")] == "katex":
-            self._katex_converter()
-        elif self._cmd == "leave":
-            self._leave()
-        elif self._cmd == "math":
-            self._math()
-        elif self._cmd[:len("msg")] == "msg":
-            self._messenger()
-        elif self._cmd == "password":
-            self._strengthen()
-        elif self._cmd == "poem" or self._cmd == "poet":
-            self._poem()
-        elif self._cmd[:len("rate")] == "rate" and "rate" in self._commands:
-            self._rate()
-        elif self._cmd == "search":
-            self._answer()
-        elif self._cmd == "stats":
-            self._get_stats()
-        elif self._cmd == "toss":
-            self._toss()
-        elif (self._cmd[:len("translate")] == "translate"
-              and "translate" in self._commands):
-            self._translate()
-        elif self._cmd == "urban":
-            self._urban()
-
-    def _alias(self):
-        """Sends the requested trip codes' holdees."""
-        if self._msg:
-            verifiers = json.loads(open("data/trip_codes.json").read())
-            if self._msg in verifiers:
-                nicks = ", ".join(verifiers[self._msg])
-                reply = ("@{} {} has the ".format(self._nick, self._msg)
-                         + "aliases {}".format(nicks))
-                nicks = utility.shorten(reply, self._maxChars, " ")
-                self._hackChat.send(reply)
+    def _message(self, ctx):
+        """Redirects commands to their respective wrapper functions.
+
+        Commands which make network requests are run by the worker pool.
+        """
+        command, ctx.args = registry.lookup(ctx.cmd)
+        if command is None or not command.available(self._config):
+            return
+        handler = functools.partial(self._run, command)
+        if not command.slow:
+            handler(ctx)
+        elif not self._pool.submit(command.name, handler, ctx):
+            _rejected.inc(command = command.name)
+            ctx.send("@{} I'm busy right now, please try again ".format(
+                ctx.nick) + "in a bit.")
+
+    def _run(self, command, ctx):
+        """Runs <command> (<registry.Command>) for <ctx> and times it."""
+        with _commandTimes.time(command = command.name):
+            command.handler(self, ctx)
+
+    @registry.command("alias")
+    def _alias(self, ctx):
+        """Sends the requested trip codes' holdees or nicks' trip codes."""
+        if ctx.msg:
+            aliases = self._state.aliases(ctx.msg)
+            trips = [] if aliases else self._state.trips(ctx.msg)
+            if aliases or trips:
+                if aliases:
+                    header = "@{} {} has the aliases ".format(ctx.nick,
+                                                              ctx.msg)
+                else:
+                    header = "@{} {} has used the trip codes ".format(
+                        ctx.nick, ctx.msg)
+                reply = formatting.truncate(
+                    formatting.joined(header, aliases or trips, ", "),
+                    self._maxChars, " ")
+                ctx.send(reply)
             else:
-                self._hackChat.send(
-                    "@{} no aliases were found".format(self._nick))
+                ctx.send(
+                    "@{} no aliases were found".format(ctx.nick))
         else:
-            self._hackChat.send(
-                "@{} tells the trip codes' aliases (e.g., ".format(self._nick)
+            ctx.send(
+                "@{} tells the trip codes' aliases or the ".format(ctx.nick)
+                + "nicks' trip codes (e.g., "
                 + "{}alias dIhdzE)".format(self._config["trigger"]))
 
-    def _afk(self):
+    @registry.command("afk")
+    def _afk(self, ctx):
         """Handles AFK statuses."""
-        afkUsers = json.loads(open("data/afk.json").read())
-        if self._hackChat.channel not in afkUsers:
-            afkUsers[self._hackChat.channel] = {}
-        afkUsers[self._hackChat.channel][self._nick] = self._msg
-        with open("data/afk.json", "w") as f:
-            json.dump(afkUsers, f, indent = 4)
-        reply = "@{} is now AFK".format(self._nick)
-        if self._msg:
-            reply += ": {}".format(self._msg)
-        self._hackChat.send(reply)
-
-    def _answer(self):
+        self._state.set_afk(ctx.channel, ctx.nick, ctx.msg)
+        reply = "@{} is now AFK".format(ctx.nick)
+        if ctx.msg:
+            reply += ": {}".format(ctx.msg)
+        ctx.send(reply)
+
+    @registry.command("search", slow = True, modules = ("commands.search",))
+    def _answer(self, ctx):
         """Handles searches."""
-        if self._msg:
-            results = search.duckduckgo(self._msg, "hack.chat bot")
+        if ctx.msg:
+            results = search.duckduckgo(ctx.msg, "hack.chat bot")
             reply = ""
             if len(results["URL"]) > 0:
                 reply += "{} ".format(results["URL"])
@@ -247,55 +280,65 @@ class HackChatBot:
                 reply += results["AbstractText"]
             else:
                 reply = ""
-            tell = "@{} ".format(self._nick)
-            reply = utility.shorten(reply, self._maxChars - len(tell), ".")
+            tell = "@{} ".format(ctx.nick)
+            reply = formatting.truncate(reply, self._maxChars - len(tell),
+                                       ".")
             if not reply:
                 reply = "Sorry, I couldn't find anything."
-            self._hackChat.send(tell + reply)
+            ctx.send(tell + reply)
         else:
-            self._hackChat.send("@{} instant answers ".format(self._nick)
-                                + "(e.g., {}search ".format(config["trigger"])
-                                + "pokemon ruby)")
+            ctx.send("@{} instant answers ".format(ctx.nick)
+                     + "(e.g., {}search ".format(self._config["trigger"])
+                     + "pokemon ruby)")
 
-    def _define(self):
+    @registry.command("define", requires = ("oxfordAppId", "oxfordAppKey"),
+                      slow = True, modules = ("commands.dictionary",))
+    def _define(self, ctx):
         """Handles definitions."""
-        if self._msg:
-            data = self._oxford.define(self._msg)
+        if ctx.msg:
+            data = self._dictionary().define(ctx.msg)
             if data["type"] == "success":
-                self._hackChat.send("@{} {}: ".format(self._nick, self._msg)
-                                    + "{}".format(data["response"]))
+                ctx.send("@{} {}: ".format(ctx.nick, ctx.msg)
+                         + "{}".format(data["response"]))
             else:
-                self._hackChat.send("@{} Sorry, I couldn't ".format(self._nick)
-                                    + "find any definitions for that.")
+                ctx.send("@{} Sorry, I couldn't ".format(ctx.nick)
+                         + "find any definitions for that.")
         else:
-            self._hackChat.send("@{} e.g., ".format(self._nick)
-                                + "{}define hello".format(config["trigger"]))
+            ctx.send("@{} e.g., ".format(ctx.nick)
+                     + "{}define hello".format(self._config["trigger"]))
 
-    def _help(self):
+    @registry.command("help", aliases = ("h",))
+    def _help(self, ctx):
         """Sends a message on how to use the bot."""
+        if ctx.cmd == "h" and ctx.msg:
+            return
         joinWith = " {}".format(self._config["trigger"])
-        reply = joinWith.join(sorted(self._commands))
+        reply = joinWith.join(registry.names(self._config))
         reply = self._config["trigger"] + reply
         if self._config["github"]:
             reply += "\nsource code: {}".format(self._config["github"])
-        self._hackChat.send(
-            "@{} {}".format(self._nick, reply))
+        ctx.send(
+            "@{} {}".format(ctx.nick, reply))
 
-    def _joiner(self):
+    @registry.command("join")
+    def _joiner(self, ctx):
         """Joins a channel."""
-        if self._msg:
-            self.join(self._msg)
+        if ctx.msg:
+            self.join(ctx.msg)
         else:
-            self._hackChat.send(
-                "@{} joins a hack.chat channel (e.g., ".format(self._nick)
-                + "{}join ben)\nYou can also ".format(config["trigger"])
+            ctx.send(
+                "@{} joins a hack.chat channel (e.g., ".format(ctx.nick)
+                + "{}join ben)\nYou can also ".format(self._config["trigger"])
                 + "invite the bot via the sidebar.")
 
-    def _joke(self):
+    @registry.command("joke", slow = True, modules = ("commands.jokes",))
+    def _joke(self, ctx):
         """Sends jokes."""
-        self._hackChat.send("@{} {}".format(self._nick, jokes.yo_momma()))
+        ctx.send("@{} {}".format(ctx.nick, jokes.yo_momma()))
 
-    def _katex_converter(self):
+    @registry.command("katex", parser = registry.options,
+                      modules = ("commands.katex",))
+    def _katex_converter(self, ctx):
         """Handles KaTeX."""
         colors = ["red", "orange", "green", "blue", "pink", "purple", "gray",
                   "rainbow"]
@@ -303,146 +346,154 @@ class HackChatBot:
                  "large", "Large", "LARGE", "huge", "Huge"]
         fonts = ["mathrm", "mathit", "mathbf", "mathsf", "mathtt", "mathbb",
                  "mathcal", "mathfrak", "mathscr"]
-        if self._msg:
+        if ctx.msg:
             disallowed = ("#", "$", "%", "&", "_", "{", "}", "\\", "?")
-            cuccoObj = cucco.Cucco()
-            newTxt = cuccoObj.replace_emojis(self._msg)
-            isEmoji = False if newTxt == self._msg else True
-            if set(self._msg).isdisjoint(disallowed) and not isEmoji:
-                data = self._cmd.split(".")
+            isEmoji = katex.has_emoji(ctx.msg)
+            if set(ctx.msg).isdisjoint(disallowed) and not isEmoji:
+                data = ctx.args
                 stringify = lambda value: value if value else ""
                 size = stringify(utility.identical_item(data, sizes))
                 color = stringify(utility.identical_item(data, colors))
                 font = stringify(utility.identical_item(data, fonts))
-                txt = katex.generator(self._msg, size, color, font)
-                self._hackChat.send("@{} says {}".format(self._nick, txt))
+                txt = katex.generator(ctx.msg, size, color, font)
+                ctx.send("@{} says {}".format(ctx.nick, txt))
             else:
                 invalid = "\"{}\"".format("\", \"".join(disallowed))
-                self._hackChat.send(
-                    "@{} KaTeX doesn't support ".format(self._nick)
+                ctx.send(
+                    "@{} KaTeX doesn't support ".format(ctx.nick)
                     + "emoji, {}".format(invalid))
         else:
-            reply = ("@{} stylizes text (e.g., ".format(self._nick)
+            reply = ("@{} stylizes text (e.g., ".format(ctx.nick)
                      + self._config["trigger"]
                      + "katex.rainbow.huge bye)\n")
             reply += "OPTIONAL COLORS: {}\n".format(", ".join(colors))
             reply += "OPTIONAL SIZES: {}\n".format(", ".join(sizes))
             reply += "OPTIONAL FONTS: {}\n".format(", ".join(fonts))
-            self._hackChat.send(reply)
+            ctx.send(reply)
 
-    def _leave(self):
+    @registry.command("leave")
+    def _leave(self, ctx):
         """Leaves the channel currently connected to if allowed."""
-        if self._hackChat.channel in self._config["doNotLeave"]:
-            self._hackChat.send("I cannot leave this channel.")
+        if ctx.channel in self._config["doNotLeave"]:
+            ctx.send("I cannot leave this channel.")
         else:
-            self._hackChat.leave()
+            if self._connector:
+                self._connector.leave(ctx.channel)
+            else:
+                ctx.hackChat.leave()
+            self._outbox.forget(ctx.channel)
 
-    def _math(self):
+    @registry.command("math", modules = ("commands.arithmetic",))
+    def _math(self, ctx):
         """Solves arithmetic problems."""
-        if self._msg:
-            answer = arithmetic.evaluate(self._msg)
-            if answer:
-                self._hackChat.send("@{} {}".format(self._nick, answer))
+        if ctx.msg:
+            answer = arithmetic.evaluate(ctx.msg)
+            if answer is not None:
+                ctx.send("@{} {}".format(ctx.nick, answer))
             else:
-                self._hackChat.send(
-                    "@{} Sorry, I couldn't solve that.".format(self._nick))
+                ctx.send(
+                    "@{} Sorry, I couldn't solve that.".format(ctx.nick))
         else:
-            self._hackChat.send(
-                "@{} solves math problems (e.g., (-2) ** 4)".format(self._nick)
+            ctx.send(
+                "@{} solves math problems (e.g., (-2) ** 4)".format(ctx.nick)
                 + "\nHow to use:\n\"+\": addition, \"-\": subtraction, \"*\": "
                 + "multiplication, \"/\": division, \"//\": floor division, "
                 + "\"**\": exponentiation, \"%\": remainder, \"(\" and \")\": "
                 + "state order of operations")
 
-    def _messenger(self):
+    @registry.command("msg", parser = registry.arguments)
+    def _messenger(self, ctx):
         """Sends saved messages to people when they're next active."""
-        info = self._cmd.split(":")
-        if len(info) == 2 and info[1] and self._msg:
-            data = {
-                "sender": self._nick,
-                "message": self._msg
-            }
-            messages = json.loads(open("data/messages.json").read())
-            if info[1] in messages:
-                messages[info[1]].append(data)
-            else:
-                messages[info[1]] = [data]
-            with open("data/messages.json", "w") as f:
-                json.dump(messages, f, indent = 4)
-            self._hackChat.send(
-                "@{}, @{} will get your message ".format(self._nick, info[1])
+        if len(ctx.args) == 1 and ctx.args[0] and ctx.msg:
+            self._state.queue_message(ctx.args[0], ctx.nick, ctx.msg)
+            ctx.send(
+                "@{}, @{} will get your message ".format(ctx.nick, ctx.args[0])
                 + "the next time they message or join a channel.")
         else:
-            self._hackChat.send(
-                "@{} sends a message to a user the next ".format(self._nick)
+            ctx.send(
+                "@{} sends a message to a user the next ".format(ctx.nick)
                 + "time they send a message or join a channel (e.g., "
                 + "{}msg:ben how are you?)".format(self._config["trigger"]))
 
-    def _poem(self):
+    @registry.command("poem", aliases = ("poet",), slow = True,
+                      modules = ("commands.paste", "commands.poetry"))
+    def _poem(self, ctx):
         """Handles poetry."""
-        if self._msg:
-            isPoet = True if self._cmd == "poet" else False
-            data = poetry.poems(self._msg, isPoet)
+        if ctx.msg:
+            isPoet = True if ctx.cmd == "poet" else False
+            data = poetry.poems(ctx.msg, isPoet)
             if data:
                 data = data[random.randint(0, len(data) - 1)]
-                header = "{} by {}".format(data["title"], data["author"])
-                if len(header) > 100:
-                    header = "{}...".format(header[:97])
-                pasted = paste.dpaste(data["poem"], title = header)
-                linked = "Read the rest at {}".format(pasted["data"])
-                reply = ("@{} {}\nBy: ".format(self._nick, data["title"])
-                         + "{}\n{}".format(data["author"], data["poem"]))
-                cut = utility.shorten_lines(reply, self._charsPerLine,
-                                            self._maxLines - 1)
-                self._hackChat.send(cut + linked)
+                byLine = "@{} {}\nBy: {}\n".format(ctx.nick, data["title"],
+                                                  data["author"])
+                cut = formatting.truncate_lines((byLine, data["poem"]),
+                                                self._charsPerLine,
+                                                self._maxLines - 1)
+                # Only poems too long to send whole are pasted.
+                if len(cut) > len(byLine) + len(data["poem"]):
+                    ctx.send(cut.rstrip("\n"))
+                else:
+                    header = "{} by {}".format(data["title"], data["author"])
+                    if len(header) > 100:
+                        header = "{}...".format(header[:97])
+                    pasted = paste.dpaste(data["poem"], title = header)
+                    ctx.send(cut + "Read the rest at {}".format(
+                        pasted["data"]))
             else:
                 reply = "@{} Sorry, I couldn't find any poems for that."
-                self._hackChat.send(reply.format(self._nick))
+                ctx.send(reply.format(ctx.nick))
         else:
-            if self._cmd == "poem":
-                self._hackChat.send(
-                    "@{} finds a poem by its name (e.g., ".format(self._nick)
+            if ctx.cmd == "poem":
+                ctx.send(
+                    "@{} finds a poem by its name (e.g., ".format(ctx.nick)
                     + "{}poem sonnet)".format(self._config["trigger"]))
             else:
-                self._hackChat.send(
-                    "@{} finds a poem from a poet (e.g., ".format(self._nick)
+                ctx.send(
+                    "@{} finds a poem from a poet (e.g., ".format(ctx.nick)
                     + "{}poet shakespeare)".format(self._config["trigger"]))
 
-    def _rate(self):
+    @registry.command("rate", parser = registry.arguments,
+                      requires = ("exchangeRateApiKey",), slow = True,
+                      modules = ("commands.currency",))
+    def _rate(self, ctx):
         """Handles currency conversion."""
         converted = False
-        data = self._cmd.split(":") if ":" in self._cmd else None
-        if data and len(data) == 3:
-            fromCode = data[1].upper()
-            toCode = data[2].upper()
+        if len(ctx.args) == 2:
+            fromCode = ctx.args[0].upper()
+            toCode = ctx.args[1].upper()
             if fromCode and toCode:
                 data = currency.convert(self._config["exchangeRateApiKey"],
                                         fromCode, toCode)
                 if data["type"] == "success":
                     converted = True
-                    self._hackChat.send("@{} 1 {} = {} {}".format(
-                        self._nick, fromCode, data["response"], toCode))
+                    ctx.send("@{} 1 {} = {} {}".format(
+                        ctx.nick, fromCode, data["response"], toCode))
         if not converted:
-            self._hackChat.send(
-                "@{} Sorry, I couldn't convert that. ".format(self._nick)
+            ctx.send(
+                "@{} Sorry, I couldn't convert that. ".format(ctx.nick)
                 + "(e.g., {}rate:usd:inr ".format(self._config["trigger"])
                 + "gives 1 USD = 64 INR)")
 
-    def _strengthen(self):
+    @registry.command("password", modules = ("commands.password",))
+    def _strengthen(self, ctx):
         """Handles passwords."""
-        if self._msg:
-            pwd = password.strengthen(self._msg)
-            self._hackChat.send("@{} {}".format(self._nick, pwd))
+        if ctx.msg:
+            pwd = password.strengthen(ctx.msg)
+            ctx.send("@{} {}".format(ctx.nick, pwd))
         else:
-            self._hackChat.send(
-                "@{} strengthens a password (e.g., ".format(self._nick)
+            ctx.send(
+                "@{} strengthens a password (e.g., ".format(ctx.nick)
                 + "{}password gum)".format(self._config["trigger"]))
 
-    def _get_stats(self):
+    @registry.command("stats")
+    def _get_stats(self, ctx):
         """Handles statistics."""
-        self._hackChat.stats()
+        ctx.hackChat.stats()
 
-    def _translate(self):
+    @registry.command("translate", parser = registry.arguments,
+                      requires = ("oxfordAppId", "oxfordAppKey"),
+                      slow = True, modules = ("commands.dictionary",))
+    def _translate(self, ctx):
         """Handles translations."""
         languages = {"english": "en",
                      "spanish": "es",
@@ -453,74 +504,73 @@ class HackChatBot:
                      "indonesian": "id",
                      "tswana": "tn"}
         explain = True
-        if self._msg and len(re.findall(":", self._cmd)) == 2:
-            data = self._cmd.lower().split(":")
-            if data[1] in languages and data[2] in languages:
+        if ctx.msg and len(ctx.args) == 2:
+            data = [arg.lower() for arg in ctx.args]
+            if data[0] in languages and data[1] in languages:
                 explain = False
-                srcLang = languages[data[1]]
-                targetLang = languages[data[2]]
-                words = self._msg.split()
-                translations = []
-                for word in words:
+                srcLang = languages[data[0]]
+                targetLang = languages[data[1]]
+                words = []
+                lastChars = []
+                for word in ctx.msg.split():
                     lastChar = word[len(word) - 1:]
                     symbol = r"[^a-zA-Z]"
-                    lastChar = lastChar if re.search(symbol, word) else ""
-                    word = re.sub(symbol, "", word)
-                    word = self._oxford.translate(word, targetLang, srcLang)
-                    if word["type"] == "failure":
-                        translations = []
-                        break
-                    translations.append(word["response"] + lastChar)
+                    lastChars.append(lastChar if re.search(symbol, word)
+                                     else "")
+                    words.append(re.sub(symbol, "", word))
+                results = self._dictionary().translate_all(
+                    words, targetLang, srcLang)
+                translations = []
+                if results and all(result["type"] == "success"
+                                   for result in results.values()):
+                    translations = [
+                        results[word]["response"] + lastChar
+                        for word, lastChar in zip(words, lastChars)
+                    ]
                 if translations:
                     translated = " ".join(translations)
-                    self._hackChat.send("@{} {}".format(self._nick,
-                                                        translated))
+                    ctx.send("@{} {}".format(ctx.nick, translated))
                 else:
-                    self._hackChat.send("@{} Sorry, I ".format(self._nick)
-                                        + "couldn't translate it all.")
+                    ctx.send("@{} Sorry, I ".format(ctx.nick)
+                             + "couldn't translate it all.")
         if explain:
-            self._hackChat.send(
-                "@{} supported languages: ".format(self._nick)
+            ctx.send(
+                "@{} supported languages: ".format(ctx.nick)
                 + "{}\ne.g., ".format(", ".join(languages.keys()))
                 + "{}".format(self._config["trigger"])
                 + "translate:english:spanish I have a holiday!\n")
 
-    def _toss(self):
+    @registry.command("toss")
+    def _toss(self, ctx):
         """Handles coin tosses."""
         result = "heads" if random.randint(0, 1) else "tails"
-        self._hackChat.send("@{} {}".format(self._nick, result))
+        ctx.send("@{} {}".format(ctx.nick, result))
 
-    def _urban(self):
+    @registry.command("urban", slow = True,
+                      modules = ("commands.dictionary",))
+    def _urban(self, ctx):
         """Handles urban definitions."""
-        if self._msg:
-            data = dictionary.urban(self._msg)
+        if ctx.msg:
+            data = dictionary.urban(ctx.msg)
             if data:
-                reply = "@{} {}: {} ".format(self._nick, data["word"],
+                reply = "@{} {}: {} ".format(ctx.nick, data["word"],
                                              data["definition"])
-                reply = utility.shorten_lines(reply, self._charsPerLine,
-                                              self._maxLines - 1)
-                self._hackChat.send(reply + data["permalink"])
+                reply = formatting.truncate_lines(reply, self._charsPerLine,
+                                                  self._maxLines - 1)
+                ctx.send(reply + data["permalink"])
             else:
-                self._hackChat.send(
-                    "@{} Sorry, I couldn't find any ".format(self._nick)
+                ctx.send(
+                    "@{} Sorry, I couldn't find any ".format(ctx.nick)
                     + "definitions for that.")
         else:
-            self._hackChat.send(
-                "@{} searches Urban Dictionary (e.g., ".format(self._nick)
+            ctx.send(
+                "@{} searches Urban Dictionary (e.g., ".format(ctx.nick)
                 + "{}urban covfefe)".format(self._config["trigger"]))
 
 
 if __name__ == "__main__":
     if not os.path.exists("data"):
         os.makedirs("data")
-    with open("data/afk.json", "w") as f:
-        json.dump({}, f, indent = 4)
-    if not os.path.isfile("data/messages.json"):
-        with open("data/messages.json", "w") as f:
-            json.dump({}, f, indent = 4)
-    if not os.path.isfile("data/trip_codes.json"):
-        with open("data/trip_codes.json", "w") as f:
-            json.dump({}, f, indent = 4)
     if not os.path.isfile("data/config.json"):
         data = {}
         print("You can change your configuration later in the file "
@@ -567,18 +617,62 @@ if __name__ == "__main__":
             "\nEnter a space-separated list of the channels the bot cannot "
             + "leave (e.g., botDev programming) (optional): ")
         data["doNotLeave"] = channels.split()
+        data["flushInterval"] = 5
+        data["compactSize"] = 4194304
+        data["stateBackend"] = "json"
+        data["engine"] = "threads"
+        data["processes"] = 1
+        data["joinRate"] = 0.2
+        data["joinBurst"] = 3
+        data["reconnectBase"] = 2
+        data["reconnectCap"] = 300
+        data["http"] = {"connectTimeout": 3.05, "readTimeout": 10,
+                        "retries": 2, "maxBytes": 2097152}
+        data["cache"] = {"path": "data/cache.json", "saveInterval": 300}
+        data["preload"] = False
+        data["metricsPort"] = None
+        data["poetryIndex"] = None
+        data["math"] = {"maxExponent": 4096, "maxDigits": 1000,
+                        "maxSteps": 1000, "timeout": None}
+        data["outbound"] = {"rate": 1, "burst": 3, "globalRate": 4,
+                            "globalBurst": 8}
+        data["workers"] = {"threads": 8, "queueDepth": 32, "timeout": 20,
+                           "limits": {"translate": 2}}
         print()
         with open("data/config.json", "w") as f:
             json.dump(data, f, indent = 4)
     config = json.loads(open("data/config.json").read())
-    bot = HackChatBot()
-    _ = ("The bot will wait 30 seconds before joining each new channel to "
-         + "prevent getting ratelimited.")
-    msg = utility.date_format("info", _)
-    print("\n{}".format(msg))
-    for channel in config["channels"]:
-        threading.Thread(target = bot.join(channel)).start()
-        _ = "The bot joined the channel: {}".format(channel)
-        msg = utility.date_format("info", _)
-        print("\n{}".format(msg))
-        time.sleep(30)
+    backoff = connections.Backoff(config.get("reconnectBase", 2),
+                                  config.get("reconnectCap", 300))
+    joinRate = config.get("joinRate", 0.2)
+    joinBurst = config.get("joinBurst", 3)
+    if config.get("metricsPort") and config.get("processes", 1) <= 1:
+        metrics.serve(config["metricsPort"])
+    # Exits through the "finally" blocks below so buffered state is
+    # written before stopping.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if config.get("processes", 1) > 1:
+        supervisor.Supervisor(config).run()
+    elif config.get("engine") == "asyncio":
+        chatEngine = engine.Engine(config["name"], config["password"],
+                                   config["url"], joinRate, joinBurst,
+                                   backoff)
+        bot = HackChatBot(chatEngine)
+        loader.print_report()
+        try:
+            chatEngine.run(bot._handle, config["channels"])
+        finally:
+            bot._state.close()
+    else:
+        manager = connections.Manager(config["name"], config["password"],
+                                      config["url"], joinRate, joinBurst,
+                                      backoff)
+        bot = HackChatBot(manager)
+        hclib.load()  # Would be imported by the first connection anyway.
+        manager.start(bot._handle, config["channels"])
+        loader.print_report()
+        try:
+            while True:
+                time.sleep(60)
+        finally:
+            bot._state.close()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+"""Caches the results of the command modules' lookups.
+
+Each source (e.g., "urban") has its own size-bounded LRU cache whose
+entries expire. "Not found" results are cached too but for less time.
+"""
+
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+import metrics
+import state
+import utility
+
+_caches = {}
+_saved = {}  # Entries loaded from disk for caches not yet created.
+_settings = {"path": None, "saveInterval": 300, "sources": {}}
+_saver = None
+_lock = threading.Lock()
+
+
+class Cache:
+    """A size-bounded LRU cache whose entries expire."""
+
+    def __init__(self, ttl=3600, negativeTtl=300, maxSize=1024):
+        """Initializes values.
+
+        Keyword arguments:
+        ttl -- <float>; seconds results are kept
+        negativeTtl -- <float>; seconds "not found" results are kept
+        maxSize -- <int>; the number of results kept before the least
+                   recently used are removed
+        """
+        self.ttl = ttl
+        self.negativeTtl = negativeTtl
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (<True>, <value>) if <key> is cached.
+
+        (<False>, <None>) is returned if it isn't.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, value, negative=False):
+        """Caches <value> for <key>.
+
+        <negative> should be <True> if <value> means "not found".
+        """
+        ttl = self.negativeTtl if negative else self.ttl
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last = False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def dump(self):
+        """Returns the unexpired entries as a JSON serializable <list>."""
+        now = time.time()
+        with self._lock:
+            return [[key, expiry, value]
+                    for key, (expiry, value) in self._entries.items()
+                    if expiry > now]
+
+    def load(self, entries):
+        """Adds <entries> returned by <dump>."""
+        now = time.time()
+        with self._lock:
+            for key, expiry, value in entries:
+                if expiry > now:
+                    self._entries[key] = (expiry, value)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last = False)
+
+
+def get_cache(source, ttl=3600, negativeTtl=300, maxSize=1024):
+    """Returns the <Cache> for <source> (<str>), creating it if needed.
+
+    Settings for <source> given to <configure> override the defaults.
+    """
+    with _lock:
+        if source not in _caches:
+            settings = {"ttl": ttl, "negativeTtl": negativeTtl,
+                        "maxSize": maxSize}
+            settings.update(_settings["sources"].get(source, {}))
+            newCache = Cache(settings["ttl"], settings["negativeTtl"],
+                             settings["maxSize"])
+            newCache.load(_saved.pop(source, []))
+            _caches[source] = newCache
+        return _caches[source]
+
+
+def cached(source, ttl=3600, negativeTtl=300, maxSize=1024, negative=None,
+           uncacheable=None, method=False):
+    """Decorates a function so that its results are cached.
+
+    The arguments of the function must be JSON serializable.
+
+    Keyword arguments:
+    source -- <str>; the name of the cache (e.g., "urban")
+    ttl, negativeTtl, maxSize -- the defaults for the <Cache>
+    negative -- <function>; returns <True> if the result means "not
+                found"
+    uncacheable -- <function>; returns <True> if the result shouldn't be
+                   cached (e.g., a server error)
+    method -- <bool>; set to <True> to ignore the first argument (i.e.,
+              <self>)
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            cache = get_cache(source, ttl, negativeTtl, maxSize)
+            key = json.dumps([args[1:] if method else args, kwargs],
+                             sort_keys = True)
+            found, value = cache.get(key)
+            if found:
+                return value
+            value = function(*args, **kwargs)
+            if not (uncacheable and uncacheable(value)):
+                cache.put(key, value, bool(negative and negative(value)))
+            return value
+        return wrapper
+    return decorator
+
+
+def _sources():
+    """Returns a <list> of (<source>, <Cache>) safe to iterate over.
+
+    <get_cache> may add caches from other threads at any time.
+    """
+    with _lock:
+        return list(_caches.items())
+
+
+def stats():
+    """Returns {<source>: {"hits": <int>, "misses": <int>, "size": <int>}}."""
+    return {source: {"hits": cache.hits, "misses": cache.misses,
+                     "size": len(cache)}
+            for source, cache in _sources()}
+
+
+def _read(path):
+    """Returns the caches saved to <path> ({<source>: <list>})."""
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save():
+    """Saves every cache to the "path" given to <configure>, if any.
+
+    Entries already in the file that aren't cached here are kept, so
+    bot processes sharing the file don't drop each others' entries.
+    """
+    path = _settings["path"]
+    if not path:
+        return
+    now = time.time()
+    data = {source: [entry for entry in entries if entry[1] > now]
+            for source, entries in _read(path).items()}
+    for source, cache in _sources():
+        entries = cache.dump()
+        keys = {entry[0] for entry in entries}
+        # Others' entries go first so they're dropped first by <load>.
+        entries = [entry for entry in data.get(source, [])
+                   if entry[0] not in keys] + entries
+        data[source] = entries[-cache.maxSize:]
+    state.write_atomic(path, data)
+
+
+def _save_periodically():
+    while True:
+        time.sleep(_settings["saveInterval"])
+        try:
+            save()
+        except Exception as exception:
+            msg = "The caches couldn't be saved: {}".format(exception)
+            print("\n{}".format(utility.date_format("warning", msg)))
+
+
+metrics.counter("hackchat_bot_cache_hits_total", "Lookups found in a cache.",
+                ("source",), lambda: {(source,): cache.hits
+                                      for source, cache in _sources()})
+metrics.counter("hackchat_bot_cache_misses_total",
+                "Lookups not found in a cache.", ("source",),
+                lambda: {(source,): cache.misses
+                         for source, cache in _sources()})
+metrics.gauge("hackchat_bot_cache_hit_ratio",
+              "The share of lookups found in a cache.", ("source",),
+              lambda: {(source,): cache.hits / (cache.hits + cache.misses)
+                       for source, cache in _sources()
+                       if cache.hits + cache.misses})
+metrics.gauge("hackchat_bot_cache_entries", "Results kept in a cache.",
+              ("source",), lambda: {(source,): len(cache)
+                                    for source, cache in _sources()})
+
+
+def configure(settings):
+    """Changes the caches' settings.
+
+    Keyword arguments:
+    settings -- <dict>; any of the following keys
+        "path": <str>; the file the caches are saved to so that they
+                survive restarts or <None> to keep them only in memory,
+        "saveInterval": <float>; seconds between saving the caches,
+        "sources": {<source>: {"ttl": <float>, "negativeTtl": <float>,
+                               "maxSize": <int>}}
+    """
+    global _saver
+    _settings.update(settings)
+    for source, overrides in _settings["sources"].items():
+        if source in _caches:
+            for name, value in overrides.items():
+                setattr(_caches[source], name, value)
+    path = _settings["path"]
+    if not path:
+        return
+    for source, entries in _read(path).items():
+        with _lock:
+            if source not in _caches:
+                _saved[source] = entries
+                continue
+        _caches[source].load(entries)
+    if _saver is None:
+        _saver = threading.Thread(target = _save_periodically, daemon = True)
+        _saver.start()
@@ -1,20 +1,197 @@
 #!/usr/bin/env python3
 
+import ast
+import math
+import multiprocessing
+import operator
 import re
+import threading
+
+_settings = {"maxExponent": 4096, "maxDigits": 1000, "maxSteps": 1000,
+             "timeout": None}
+_allowed = re.compile(r"[0-9+\-*/%()]*")
+_binary = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow
+}
+_unary = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_sandbox = None
+_sandboxLock = threading.Lock()
+
+
+class LimitExceeded(Exception):
+    """Raised when an expression would be too costly to evaluate."""
+
+
+class Evaluator:
+    """Evaluates arithmetic expressions without <eval>.
+
+    The expression is parsed into an AST and only numbers, "+", "-", "*",
+    "/", "//", "%", "**" and brackets are evaluated. Operations whose
+    result would be too large are refused before they're computed so no
+    expression can take long.
+    """
+
+    def __init__(self, maxExponent=4096, maxDigits=1000, maxSteps=1000):
+        """Initializes values.
+
+        Keyword arguments:
+        maxExponent -- <int>; the largest exponent allowed
+        maxDigits -- <int>; the most digits an integer may have
+        maxSteps -- <int>; the most nodes an expression may have
+        """
+        self._maxExponent = maxExponent
+        self._maxBits = math.ceil(maxDigits * math.log2(10))
+        self._maxSteps = maxSteps
+
+    def evaluate(self, string):
+        """Returns the value of <string> (<str>) or <None> if it's invalid.
+
+        <LimitExceeded> is raised if <string> is too costly.
+        """
+        string = re.sub(r"\s", "", string)
+        if not _allowed.fullmatch(string):
+            return None
+        try:
+            tree = ast.parse(string, mode = "eval")
+        except (SyntaxError, ValueError, RecursionError, MemoryError):
+            return None
+        if sum(1 for _ in ast.walk(tree)) > self._maxSteps:
+            raise LimitExceeded("too many steps")
+        try:
+            return self._evaluate(tree.body)
+        except (ArithmeticError, TypeError, ValueError, RecursionError):
+            return None
+
+    def _evaluate(self, node):
+        if isinstance(node, ast.Constant) and type(node.value) is int:
+            self._check(node.value)
+            return node.value
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _unary:
+            return _unary[type(node.op)](self._evaluate(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in _binary:
+            left = self._evaluate(node.left)
+            right = self._evaluate(node.right)
+            self._check_operation(node.op, left, right)
+            result = _binary[type(node.op)](left, right)
+            self._check(result)
+            return result
+        raise TypeError("unsupported syntax")
+
+    def _bits(self, number):
+        """Returns about how many bits <number> (<int> or <float>) has."""
+        if isinstance(number, int):
+            return abs(number).bit_length()
+        return max(0, math.frexp(number)[1])
+
+    def _check(self, number):
+        """Raises <LimitExceeded> if <number> is too large to keep."""
+        if isinstance(number, complex) or (isinstance(number, float)
+                                           and not math.isfinite(number)):
+            raise ValueError("not a real number")
+        if self._bits(number) > self._maxBits:
+            raise LimitExceeded("result too large")
+
+    def _check_operation(self, op, left, right):
+        """Raises <LimitExceeded> if <left> <op> <right> would be too large.
+
+        The size of the result is estimated from the operands' sizes
+        without computing it.
+        """
+        if isinstance(op, (ast.Add, ast.Sub)):
+            bits = max(self._bits(left), self._bits(right)) + 1
+        elif isinstance(op, ast.Mult):
+            bits = self._bits(left) + self._bits(right)
+        elif isinstance(op, ast.Pow):
+            if abs(right) > self._maxExponent:
+                raise LimitExceeded("exponent too large")
+            bits = math.log2(abs(left)) * right if abs(left) > 1 else 0
+        else:
+            return
+        if bits > self._maxBits:
+            raise LimitExceeded("result too large")
+
+
+def _serve(connection, settings):
+    """Evaluates the expressions received over <connection> forever."""
+    evaluator = Evaluator(settings["maxExponent"], settings["maxDigits"],
+                          settings["maxSteps"])
+    while True:
+        string = connection.recv()
+        try:
+            connection.send(evaluator.evaluate(string))
+        except LimitExceeded:
+            connection.send(None)
+
+
+def _evaluate_isolated(string, timeout):
+    """Evaluates <string> in a separate process killed after <timeout>."""
+    global _sandbox
+    with _sandboxLock:
+        if _sandbox is None or not _sandbox[0].is_alive():
+            context = multiprocessing.get_context("spawn")
+            connection, child = context.Pipe()
+            process = context.Process(target = _serve,
+                                      args = (child, dict(_settings)),
+                                      daemon = True)
+            process.start()
+            _sandbox = (process, connection)
+        process, connection = _sandbox
+        try:
+            connection.send(string)
+            if connection.poll(timeout):
+                return connection.recv()
+        except (EOFError, OSError):
+            pass  # The process died, e.g., it ran out of memory.
+        process.terminate()
+        _sandbox = None
+        return None
+
+
+def configure(settings):
+    """Changes the limits <evaluate> uses.
+
+    Keyword arguments:
+    settings -- <dict>; any of the following keys
+        "maxExponent": <int>; the largest exponent allowed,
+        "maxDigits": <int>; the most digits an integer may have,
+        "maxSteps": <int>; the most numbers and operators an expression
+                    may have,
+        "timeout": <float>; seconds an expression may take, evaluating
+                   it in a separate process (unless this is a daemon
+                   process), or <None> to evaluate it in this one
+    """
+    global _sandbox
+    _settings.update(settings)
+    with _sandboxLock:
+        if _sandbox is not None:
+            _sandbox[0].terminate()
+            _sandbox = None
 
 
 def evaluate(string):
-    """Safely evaluates mathematical expressions using an eval.
+    """Safely evaluates mathematical expressions without using an eval.
+
+    Expressions too costly to evaluate within the limits given to
+    <configure> are treated as invalid.
 
     Keyword arguments:
     string -- <str>; the mathematical expression
 
     Returns a number if successful otherwise <None>.
     """
-    string = re.sub(r"\s", "", string)
-    allowed = [str(i) for i in range(0, 10)]
-    allowed += ["+", "-", "*", "/", "%", "(", ")"]
-    for char in string:
-        if char not in allowed:
-            return None
-    return eval(string)
+    # Daemon processes (e.g., the supervisors' workers) can't start the
+    # separate process, so they rely on the limits alone.
+    if _settings["timeout"] and not multiprocessing.current_process().daemon:
+        return _evaluate_isolated(string, _settings["timeout"])
+    evaluator = Evaluator(_settings["maxExponent"], _settings["maxDigits"],
+                          _settings["maxSteps"])
+    try:
+        return evaluator.evaluate(string)
+    except LimitExceeded:
+        return None
@@ -1,6 +1,90 @@
 #!/usr/bin/env python3
 
-import requests
+import threading
+import time
+
+import httpclient
+
+_tables = {}
+_tablesLock = threading.Lock()
+
+
+class RateTable:
+    """Keeps a table of exchange rates for one base currency in memory.
+
+    Any pair of currencies is converted locally using the cross rate so
+    only one API request is made per refresh regardless of how many
+    conversions are done. The table is refreshed in the background and
+    the last table fetched keeps being used if refreshing fails.
+    """
+
+    def __init__(self, apiKey, base="USD", refresh=3600, maxAge=86400):
+        """Initializes values.
+
+        Keyword arguments:
+        apiKey -- <str>; the API key
+        base -- <str>; the currency code the table is fetched for
+        refresh -- <float>; seconds between refreshing the table
+        maxAge -- <float>; seconds a table may be used for if refreshing
+                  it keeps failing
+        """
+        self._apiKey = apiKey
+        self._base = base
+        self._refresh = refresh
+        self._maxAge = maxAge
+        self._rates = None
+        self._fetched = 0
+        self._error = None
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def _fetch(self):
+        """Fetches the table and returns <True> if it succeeded."""
+        url = "https://v3.exchangerate-api.com/bulk/{}/{}"
+        url = url.format(self._apiKey, self._base)
+        try:
+            response = httpclient.get(url).json()
+        except Exception as exception:
+            self._error = str(exception)
+            return False
+        if response["result"] != "success":
+            self._error = response["error"]
+            return False
+        self._rates = response["rates"]
+        self._fetched = time.time()
+        self._error = None
+        return True
+
+    def _refresh_periodically(self):
+        while True:
+            delay = self._refresh if self._error is None else 60
+            time.sleep(delay)
+            self._fetch()
+
+    def _expired(self):
+        return self._rates is None or time.time() - self._fetched > \
+            self._maxAge
+
+    def rates(self):
+        """Returns {<code>: <rate>} or <None> if no usable table exists."""
+        with self._lock:
+            if self._expired():
+                self._fetch()
+            if self._refresher is None and self._rates is not None:
+                self._refresher = threading.Thread(
+                    target = self._refresh_periodically, daemon = True)
+                self._refresher.start()
+            return None if self._expired() else self._rates
+
+    def convert(self, fromCode, toCode):
+        """Returns the same values as <convert>."""
+        rates = self.rates()
+        if rates is None:
+            return {"type": "failure", "response": self._error}
+        if fromCode not in rates or toCode not in rates:
+            return {"type": "failure", "response": "unknown-code"}
+        rate = float("{:.6g}".format(rates[toCode] / rates[fromCode]))
+        return {"type": "success", "response": rate}
 
 
 def convert(apiKey, fromCode, toCode):
@@ -8,6 +92,7 @@ def convert(apiKey, fromCode, toCode):
 
     Get the API key from https://www.exchangerate-api.com/.
     Currency codes must be from ISO 4217 Three Letter Currency Codes.
+    Rates come from a <RateTable> shared by every call using <apiKey>.
 
     Keyword arguments:
     apiKey -- <str>; the API key
@@ -36,9 +121,8 @@ def convert(apiKey, fromCode, toCode):
             "response": "quota-reached"
         }
     """
-    url = "https://v3.exchangerate-api.com/pair/{}/{}/{}"
-    url = url.format(apiKey, fromCode, toCode)
-    response = requests.get(url).json()
-    if response["result"] != "success":
-        return {"type": "failure", "response": response["error"]}
-    return {"type": "success", "response": response["rate"]}
+    with _tablesLock:
+        if apiKey not in _tables:
+            _tables[apiKey] = RateTable(apiKey)
+        table = _tables[apiKey]
+    return table.convert(fromCode, toCode)
@@ -2,9 +2,16 @@
 
 """Contains functionality from various dictionaries."""
 
+import concurrent.futures
 import re
-import requests
-import json
+import time
+
+import cache
+import httpclient
+import jsonstream
+
+_lookups = concurrent.futures.ThreadPoolExecutor(
+    8, thread_name_prefix = "oxford")
 
 
 class Oxford():
@@ -23,6 +30,10 @@ class Oxford():
         self.appId = appId
         self.appKey = appKey
 
+    @cache.cached("define", ttl = 86400, negativeTtl = 3600,
+                  negative = lambda data: data["type"] == "failure",
+                  uncacheable = lambda data: data["response"] == 500,
+                  method = True)
     def define(self, word, lang="en"):
         """Returns a definition.
 
@@ -55,7 +66,7 @@ class Oxford():
         url = "https://od-api.oxforddictionaries.com/api/v1/entries/{}/{}"
         url = url.format(lang, word.lower())
         headers = {"app_id": self.appId, "app_key": self.appKey}
-        site = requests.get(url, headers = headers)
+        site = httpclient.get(url, headers = headers)
         if site.status_code == 404 or site.status_code == 500:
             return {"type": "failure", "response": site.status_code}
         data = site.json()
@@ -66,6 +77,48 @@ class Oxford():
         else:
             return {"type": "failure", "response": None}
 
+    def translate_all(self, words, targetLang, srcLang="en", fanOut=4,
+                      deadline=10):
+        """Translates each of <words> concurrently.
+
+        Each distinct word is looked up once with at most <fanOut>
+        lookups running at a time.
+
+        Keyword arguments:
+        words -- <list>; the words (<str>) to be translated
+        targetLang -- <str>; the IANA language code to translate to
+        srcLang -- <str>; the IANA language code <words> are in
+        fanOut -- <int>; the number of words looked up at once
+        deadline -- <float>; seconds to wait for every translation
+
+        Returns {<word>: <dict>} where each <dict> is a return value of
+        <translate>, or <None> if the deadline passed.
+        """
+        remaining = list(reversed(dict.fromkeys(words)))
+        end = time.monotonic() + deadline
+        futures = {}
+        running = set()
+        # Words are only submitted as slots free up, so a call never has
+        # more than <fanOut> of the shared pools' threads.
+        while remaining or running:
+            if time.monotonic() >= end:
+                for future in running:
+                    future.cancel()
+                return None
+            while remaining and len(running) < fanOut:
+                word = remaining.pop()
+                futures[word] = _lookups.submit(self.translate, word,
+                                                targetLang, srcLang)
+                running.add(futures[word])
+            done, running = concurrent.futures.wait(
+                running, timeout = max(0, end - time.monotonic()),
+                return_when = concurrent.futures.FIRST_COMPLETED)
+        return {word: future.result() for word, future in futures.items()}
+
+    @cache.cached("translate", ttl = 604800, negativeTtl = 3600,
+                  negative = lambda data: data["type"] == "failure",
+                  uncacheable = lambda data: data["response"] == 500,
+                  method = True)
     def translate(self, word, targetLang, srcLang="en"):
         """Translates <word> from <srcLang> to <targetLang>.
 
@@ -115,7 +168,7 @@ class Oxford():
                + "{}/{}/translations={}")
         url = url.format(srcLang, word.lower(), targetLang)
         headers = {"app_id": self.appId, "app_key": self.appKey}
-        site = requests.get(url, headers = headers)
+        site = httpclient.get(url, headers = headers)
         if re.match(r"400|404|500", str(site.status_code)):
             return {"type": "failure", "response": site.status_code}
         data = site.json()
@@ -130,6 +183,8 @@ class Oxford():
         return {"type": "success", "response": data}
 
 
+@cache.cached("urban", ttl = 3600, negativeTtl = 600,
+              negative = lambda data: data is None)
 def urban(search):
     """Gives definitions from Urban Dictionary.
 
@@ -150,10 +205,13 @@ def urban(search):
         <None>
     """
     url = "http://api.urbandictionary.com/v0/define?term={}".format(search)
-    data = requests.get(url).text
-    data = json.loads(data)
-    if data["result_type"] == "no_results":
-        return None
-    data = data["list"][0]
-    return {"word": data["word"], "definition": data["definition"],
-            "permalink": data["permalink"]}
+    with httpclient.stream("GET", url) as response:
+        reader = jsonstream.Reader(response.iter_text())
+        for key in reader.members():
+            if key == "list":
+                for index in reader.elements():
+                    data = reader.value()
+                    return {"word": data["word"],
+                            "definition": data["definition"],
+                            "permalink": data["permalink"]}
+    return None
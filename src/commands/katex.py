@@ -1,8 +1,49 @@
 #!/usr/bin/env python3
 
-import re
+import functools
+import string
+import threading
 
+import cucco
 
+_rainbow = ("red", "orange", "green", "blue", "purple", "pink")
+_cucco = None
+_cuccoLock = threading.Lock()
+
+
+def has_emoji(txt):
+    """Returns <True> if <txt> (<str>) contains emoji.
+
+    The emoji detector is only loaded once.
+    """
+    global _cucco
+    with _cuccoLock:
+        if _cucco is None:
+            _cucco = cucco.Cucco()
+    return _cucco.replace_emojis(txt) != txt
+
+
+@functools.lru_cache(maxsize = 256)
+def _glyphs(font, color):
+    """Returns the glyph tables for a style.
+
+    There's a table per color used in turn (six for "rainbow", otherwise
+    one) mapping each printable character to its KaTeX. The format
+    string for other characters is stored under <None>.
+    """
+    font = "\\{}".format(font) if font else ""
+    colors = _rainbow if color == "rainbow" else (color,)
+    tables = []
+    for name in colors:
+        katexColor = "\\{}".format(name) if name else ""
+        table = {char: "{}{}{{{}}}".format(font, katexColor, char)
+                 for char in string.printable if not char.isspace()}
+        table[None] = "{}{}{{{{{{}}}}}}".format(font, katexColor)
+        tables.append(table)
+    return tuple(tables)
+
+
+@functools.lru_cache(maxsize = 1024)
 def generator(txt, size="normalsize", color="", font=""):
     """Returns KaTeX formatted <txt> (<str>).
 
@@ -22,25 +63,22 @@ def generator(txt, size="normalsize", color="", font=""):
            "\mathbf", "\mathsf", "\mathtt", "\mathbb", "\mathcal",
            "\mathfrak", "\mathscr", "\textrm", "\textit", "\textbf",
            "\textsf", "\texttt", "\textnormal", "\Bbb", "\bold", "\frak"
+
+    Recently generated results are memoized.
     """
-    if color and color != "rainbow":
-        katexColor = "\\{}".format(color)
-    else:
-        katexColor = color
-    if font:
-        font = "\\{}".format(font)
-    rainbow = ["red", "orange", "green", "blue", "purple", "pink"]
-    txt = " ".join(txt.split())
-    text = ""
-    index = 0
-    for char in txt:
-        if color == "rainbow" and char != " ":
-            katexColor = "\\" + rainbow[index % 6]
-        if char == " ":
-            text += "\\ "
-        else:
-            text += "%s%s{%s}" % (font, katexColor, char)
-            index += 1
     if size:
         size = "\\{}".format(size)
-    return "${}$".format(size + text)
+    glyphs = _glyphs(font, color)
+    parts = [size]
+    index = 0
+    for word in txt.split():
+        if index:
+            parts.append("\\ ")
+        for char in word:
+            table = glyphs[index % len(glyphs)]
+            glyph = table.get(char)
+            if glyph is None:
+                glyph = table[None].format(char)
+            parts.append(glyph)
+            index += 1
+    return "${}$".format("".join(parts))
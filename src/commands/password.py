@@ -14,7 +14,7 @@ def strengthen(pwd, spChars=True):
     spChars -- <bool>; specifies if special characters can be used in
                the password
     """
-    random.seed(datetime.datetime.now())
+    random.seed(datetime.datetime.now().timestamp())
     spCharsSet = ("{", "}", "(", ")", "[", "]", "#", ":", ";", "^", ",", ".",
                   "?", "!", "|", "&", "_", "`", "~", "@", "$", "%", "/", "\\",
                   "+", "-", "*", "=", "'", "\"")
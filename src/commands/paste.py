@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-import requests
+import httpclient
 
 
 def dpaste(content, syntax="text", title="", poster="", expiryDays=1):
@@ -36,7 +36,7 @@ def dpaste(content, syntax="text", title="", poster="", expiryDays=1):
              "title": title,
              "poster": poster,
              "expiry_days": expiryDays}
-    data = requests.post("http://dpaste.com/api/v2/", data = paste).text
+    data = httpclient.post("http://dpaste.com/api/v2/", data = paste).text
     if data[:len("http://")] == "http://":
         return {"type": "success", "data": data}
     return {"type": "failure", "data": data}
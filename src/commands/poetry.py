@@ -1,11 +1,39 @@
 #!/usr/bin/env python3
 
-import requests
-import json
+import random
+
+import cache
+import httpclient
+import jsonstream
+import poetryindex
+
+_sampleSize = 8
+_maxChars = 1048576  # Of a response read; the poems in the rest are lost.
+_index = None
+
+
+def configure(settings):
+    """Changes where poems are looked up.
+
+    Keyword arguments:
+    settings -- <dict>; any of the following keys
+        "index": <str>; the path of an index built by <poetryindex> to
+                 search instead of poetrydb.org, or <None>
+    """
+    global _index
+    if _index is not None:
+        _index.close()
+        _index = None
+    path = settings.get("index")
+    if path:
+        _index = poetryindex.PoetryIndex(path)
 
 
 def poems(search, isAuthor):
-    """Returns poems with their titles and authors.
+    """Returns up to eight random poems with their titles and authors.
+
+    The index given to <configure> is searched if there is one and
+    poetrydb.org otherwise.
 
     Keyword arguments:
     search -- <str>; the name of the poem or poet
@@ -24,16 +52,47 @@ def poems(search, isAuthor):
     no poem found (<None>):
         <None>
     """
+    if _index is not None:
+        found = _index.search(search, isAuthor)
+        found = random.sample(found, min(len(found), _sampleSize))
+        return [_index.poem(number) for number in found] or None
+    found = _download(search, isAuthor)
+    if not found:
+        return None
+    return random.sample(found, min(len(found), _sampleSize))
+
+
+def _limited(chunks, limit):
+    """Yields <chunks> (<str>s) until <limit> characters have been."""
+    for chunk in chunks:
+        yield chunk[:limit]
+        limit -= len(chunk)
+        if limit <= 0:
+            return
+
+
+@cache.cached("poetry", ttl = 86400, negativeTtl = 3600, maxSize = 32,
+              negative = lambda data: data is None)
+def _download(search, isAuthor):
+    """Returns every poem (<list>) found on poetrydb.org or <None>.
+
+    The list is cached and <poems> samples it on every call. At most
+    <_maxChars> of the response are read, which covers all but the
+    most prolific poets.
+    """
     which = "author" if isAuthor else "title"
     url = "http://poetrydb.org/{}/{}".format(which, search)
-    data = requests.get(url).text
-    data = json.loads(data)
-    if "status" in data:  # A status is sent only if the search failed.
-        return None
-    data = data[0]
     poems = []
-    for part in data:
-        poem = {"title": data["title"], "author": data["author"],
-                "poem": "\n".join(data["lines"])}
-        poems.append(poem)
-    return poems
+    with httpclient.stream("GET", url) as response:
+        reader = jsonstream.Reader(_limited(response.iter_text(), _maxChars))
+        if reader.peek() != "[":  # A status is sent only if the search failed.
+            return None
+        try:
+            for index in reader.elements():
+                data = reader.value()
+                poems.append({"title": data["title"],
+                              "author": data["author"],
+                              "poem": "\n".join(data["lines"])})
+        except ValueError:
+            pass  # The response was cut at <_maxChars>.
+    return poems or None
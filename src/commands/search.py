@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 
-import requests
-import json
+import cache
+import httpclient
+import jsonstream
 
+_fields = ("AbstractText", "AbstractSource", "Heading", "Answer",
+           "Definition", "DefinitionSource", "DefinitionURL")
 
+
+@cache.cached("search", ttl = 3600, negativeTtl = 600,
+              negative = lambda items: not (items["Answer"]
+                                            or items["AbstractText"]))
 def duckduckgo(search, appName=""):
     """Gives instant answers from DuckDuckGo (https://duckduckgo.com/).
 
@@ -28,16 +35,20 @@ def duckduckgo(search, appName=""):
     """
     url = "http://api.duckduckgo.com/?q={}&format=json&t={}"
     url = url.format(search, appName)
-    data = requests.get(url).text
-    data = json.loads(data)
-    items = {"AbstractText": data["AbstractText"],
-             "AbstractSource": data["AbstractSource"],
-             "Heading": data["Heading"],
-             "Answer": data["Answer"],
-             "Definition": data["Definition"],
-             "DefinitionSource": data["DefinitionSource"],
-             "DefinitionURL": data["DefinitionURL"]}
-    exists = True if len(data["Results"]) > 0 else False
-    items["URL"] = data["Results"][0]["FirstURL"] if exists else ""
-    items["URLText"] = data["Results"][0]["Text"] if exists else ""
+    items = dict.fromkeys(_fields + ("URL", "URLText"), "")
+    wanted = set(_fields + ("Results",))
+    with httpclient.stream("GET", url) as response:
+        reader = jsonstream.Reader(response.iter_text())
+        for key in reader.members():
+            if key in _fields:
+                items[key] = reader.value()
+            elif key == "Results":
+                for index in reader.elements():
+                    if index == 0:
+                        result = reader.value()
+                        items["URL"] = result["FirstURL"]
+                        items["URLText"] = result["Text"]
+            wanted.discard(key)
+            if not wanted:
+                break
     return items
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+"""Joins channels without blocking and keeps their connections alive."""
+
+import queue
+import random
+import threading
+import time
+
+import loader
+import outbound
+import utility
+
+hclib = loader.lazy("hclib")
+
+# Connection states.
+WAITING = "waiting to join"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+LEFT = "left"
+
+
+def report(channel, state):
+    """Prints that <channel> (<str>) is now in <state> (<str>)."""
+    msg = "{}: {}".format(channel, state)
+    print("\n{}".format(utility.date_format("info", msg)))
+
+
+class Backoff:
+    """Gives jittered exponential delays between reconnection attempts."""
+
+    def __init__(self, base=2, cap=300):
+        """Initializes values.
+
+        Keyword arguments:
+        base -- <float>; the longest delay in seconds after the first
+                failure
+        cap -- <float>; the longest delay in seconds after any failure
+        """
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt):
+        """Returns the seconds to wait after <attempt> (<int>) failures."""
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+_joiningClass = None
+
+
+def _joining_class():
+    """Returns an <hclib.HackChat> subclass which reports joining.
+
+    <hclib.HackChat> blocks until the connection closes and only calls
+    back when an event arrives, so the join is reported from
+    <_on_open> instead.
+    """
+    global _joiningClass
+    if _joiningClass is None:
+        class JoiningHackChat(hclib.HackChat):
+            def __init__(self, onJoin, *args):
+                self._onJoin = onJoin
+                super().__init__(*args)
+
+            def _on_open(self, ws):
+                super()._on_open(ws)
+                self._onJoin(self)
+
+        _joiningClass = JoiningHackChat
+    return _joiningClass
+
+
+class Manager:
+    """Keeps an <hclib.HackChat> connection per channel alive.
+
+    Channels are joined through a token bucket so the bot isn't
+    ratelimited, but joining never blocks the caller. Connections which
+    drop are reconnected after a <Backoff> delay.
+    """
+
+    def __init__(self, nick, password, url, joinRate=0.2, joinBurst=3,
+                 backoff=None):
+        """Initializes values.
+
+        Keyword arguments:
+        nick -- <str>; the bots' name
+        password -- <str>; the password used to generate the trip code
+        url -- <str>; the websocket URL of the hack.chat instance
+        joinRate -- <float>; channels joined per second
+        joinBurst -- <int>; channels that can be joined at once
+        backoff -- <Backoff>; delays between reconnecting
+        """
+        self._nick = nick
+        self._password = password
+        self._url = url
+        self._joins = outbound.TokenBucket(joinRate, joinBurst)
+        self._backoff = backoff or Backoff()
+        self._callback = None
+        self._pending = queue.Queue()
+        self._states = {}
+        self._connections = {}
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def start(self, callback, channels):
+        """Starts joining <channels> (<list>) and returns immediately.
+
+        <callback> is called with the connection and data of each event.
+        """
+        self._callback = callback
+        threading.Thread(target = self._join_queued, daemon = True).start()
+        for channel in channels:
+            self.join(channel)
+
+    def states(self):
+        """Returns the state (<str>) of each channel ({<channel>: <str>})."""
+        with self._lock:
+            return dict(self._states)
+
+    def _set_state(self, channel, state):
+        with self._lock:
+            if self._states.get(channel) == LEFT:
+                return
+            self._states[channel] = state
+        report(channel, state)
+
+    def join(self, channel):
+        """Joins <channel> (<str>) unless it's already joined."""
+        with self._lock:
+            if self._states.get(channel, LEFT) != LEFT:
+                return
+            self._states[channel] = WAITING
+        report(channel, WAITING)
+        self._pending.put(channel)
+
+    def leave(self, channel):
+        """Leaves <channel> (<str>) without reconnecting."""
+        with self._lock:
+            self._states[channel] = LEFT
+            connection = self._connections.pop(channel, None)
+        report(channel, LEFT)
+        if connection:
+            connection.leave()
+
+    def _join_queued(self):
+        while True:
+            channel = self._pending.get()
+            wait = self._joins.delay()
+            while wait:
+                time.sleep(wait)
+                wait = self._joins.delay()
+            self._joins.take()
+            if self.states().get(channel) == LEFT:
+                continue
+            threading.Thread(target = self._connect, args = (channel,),
+                             daemon = True).start()
+
+    def _connect(self, channel):
+        """Stays connected to <channel> until it's left."""
+        self._set_state(channel, CONNECTING)
+
+        def joined(connection):
+            with self._lock:
+                left = self._states.get(channel) == LEFT
+                if not left:
+                    self._connections[channel] = connection
+                    self._attempts[channel] = 0
+            if left:
+                connection.leave()
+            else:
+                self._set_state(channel, CONNECTED)
+
+        try:
+            _joining_class()(joined, self._callback, self._nick, channel,
+                             self._password, self._url)
+        except Exception as exception:
+            msg = "The connection to {} failed: {}".format(channel, exception)
+            print("\n{}".format(utility.date_format("warning", msg)))
+        with self._lock:
+            self._connections.pop(channel, None)
+            if self._states.get(channel) == LEFT:
+                return
+            attempt = self._attempts.get(channel, 0)
+            self._attempts[channel] = attempt + 1
+        self._set_state(channel, RECONNECTING)
+        time.sleep(self._backoff.delay(attempt))
+        with self._lock:
+            if self._states.get(channel) == LEFT:
+                return
+            self._states[channel] = WAITING
+        self._pending.put(channel)
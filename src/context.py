@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""Contains the per-event data passed to the bots' handlers."""
+
+import re
+import time
+
+import outbound
+
+_whitespace = re.compile(r"\s")
+_mention = re.compile(r"(?:^| )@([^ ]+)(?= |$)")
+
+
+class Context:
+    """Holds the data of one event sent from https://hack.chat.
+
+    Each event gets its own <Context> so events from different channels
+    can be handled at the same time without overwriting each other.
+
+    Attributes:
+    hackChat -- the connection object the event came from
+    type -- <str>; the type of event (e.g., "message")
+    nick -- <str>; the nickname of the user who caused the event
+    trip -- <str>; the trip code of <nick>
+    channel -- <str>; the channel the event came from
+    text -- <str>; the stripped text of a message
+    cmd -- <str>; the command called (e.g., "msg:ben") without the
+           trigger or <None> if the bot wasn't called
+    args -- <list>; the arguments (<str>) given in <cmd> (e.g., ["usd",
+            "inr"] for "rate:usd:inr") once it's looked up
+    msg -- <str>; the text following the first whitespace in <text>
+    mentions -- <tuple>; the nicks (<str>) @mentioned in <text> in the
+                order they first appear
+    ips -- <int>; the number of unique IPs from a "stats" event
+    channels -- <int>; the number of channels from a "stats" event
+    warning -- <str>; the text of a "warn" event
+    deadline -- <float>; the <time.monotonic> time after which replies
+                are dropped or <None> for no deadline
+    outbox -- <outbound.Scheduler>; paces replies or <None> to send them
+              straight away
+    """
+
+    __slots__ = ("hackChat", "type", "nick", "trip", "channel", "text",
+                 "cmd", "args", "msg", "mentions", "ips", "channels",
+                 "warning", "deadline", "outbox")
+
+    def __init__(self, hackChat, info, outbox=None):
+        """Reads the fields of <info> (<dict>) sent over <hackChat>."""
+        self.hackChat = hackChat
+        self.type = info["type"]
+        self.nick = info.get("nick")
+        self.trip = info.get("trip")
+        self.channel = hackChat.channel
+        self.text = info["text"].strip() if "text" in info else None
+        self.cmd = None
+        self.args = []
+        self.msg = None
+        self.mentions = ()
+        self.ips = info.get("IPs")
+        self.channels = info.get("channels")
+        self.warning = info.get("warning")
+        self.deadline = None
+        self.outbox = outbox
+
+    def send(self, text, priority=outbound.REPLY):
+        """Sends <text> (<str>) to the channel the event came from.
+
+        Nothing is sent if <deadline> has passed. <priority> is one of
+        <outbound.REPLY>, <outbound.NOTICE> or <outbound.BULK>.
+        """
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            return
+        self.emit(text, priority)
+
+    def emit(self, text, priority=outbound.REPLY):
+        """Sends <text> (<str>) even if <deadline> has passed."""
+        if self.outbox:
+            self.outbox.send(self.hackChat, text, priority)
+        else:
+            self.hackChat.send(text)
+
+
+class Parser:
+    """Makes <Context>s, finding the command and mentions of messages.
+
+    The patterns used are compiled once for the bots' trigger so each
+    message is only scanned a few times.
+    """
+
+    def __init__(self, trigger, outbox=None):
+        """Initializes values.
+
+        Keyword arguments:
+        trigger -- <str>; the prefix used to call the bot
+        outbox -- <outbound.Scheduler>; paces replies
+        """
+        self._command = re.compile(re.escape(trigger) + r"(\S*)")
+        self._outbox = outbox
+
+    def parse(self, hackChat, info):
+        """Returns a <Context> for the event <info> (<dict>).
+
+        <hackChat> is the connection object the event came from.
+        """
+        ctx = Context(hackChat, info, self._outbox)
+        text = ctx.text
+        if text is not None:
+            space = _whitespace.search(text)
+            ctx.msg = text[space.end():].strip() if space else None
+            called = self._command.match(text)
+            if called:
+                ctx.cmd = called.group(1)
+            if "@" in text:
+                ctx.mentions = tuple(dict.fromkeys(_mention.findall(text)))
+        return ctx
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+"""Keeps the bots' AFK statuses, saved messages and trip codes in SQLite.
+
+This is an alternative to <state.State> for bots with a lot of data. Set
+"stateBackend" to "sqlite" in "config.json" to use it.
+"""
+
+import contextlib
+import os
+import sqlite3
+import threading
+
+import journal
+import metrics
+import state
+import tripindex
+
+_writes = metrics.histogram("hackchat_bot_store_write_seconds",
+                            "Seconds taken to write the store to disk.",
+                            ("backend",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS trip_codes (
+    id INTEGER PRIMARY KEY,
+    trip TEXT NOT NULL,
+    nick TEXT NOT NULL,
+    UNIQUE (trip, nick)
+);
+CREATE INDEX IF NOT EXISTS trip_codes_nick ON trip_codes (nick, trip);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_recipient ON messages (recipient);
+CREATE TABLE IF NOT EXISTS afk (
+    channel TEXT NOT NULL,
+    nick TEXT NOT NULL,
+    reason TEXT,
+    PRIMARY KEY (channel, nick)
+) WITHOUT ROWID;
+"""
+
+
+class Database:
+    """Holds AFK statuses, saved messages and trip codes in SQLite.
+
+    Has the same methods as <state.State>. Each call borrows a connection
+    from a small pool, so threads which come and go (e.g., one per
+    reconnect) don't leave connections open, and the database runs in
+    WAL mode so reads never wait for writes.
+    """
+
+    def __init__(self, folder="data", poolSize=4):
+        """Opens (and if needed creates) "state.db" in <folder> (<str>).
+
+        The first time the database is created, the JSON state saved in
+        <folder> is migrated to it. At most <poolSize> (<int>) idle
+        connections are kept open.
+        """
+        self._folder = folder
+        self._path = os.path.join(folder, "state.db")
+        self._poolSize = poolSize
+        self._idle = []
+        self._lock = threading.Lock()
+        with self._db() as db:
+            db.executescript(_SCHEMA)
+            migrated = db.execute(
+                "SELECT value FROM meta WHERE key = 'migrated'").fetchone()
+        if not migrated:
+            self._migrate()
+
+    @contextlib.contextmanager
+    def _db(self):
+        """Lends a connection, returning it to the pool afterwards."""
+        with self._lock:
+            db = self._idle.pop() if self._idle else None
+        if db is None:
+            db = sqlite3.connect(self._path, isolation_level = None,
+                                 check_same_thread = False)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+        try:
+            yield db
+        finally:
+            with self._lock:
+                if len(self._idle) < self._poolSize:
+                    self._idle.append(db)
+                    db = None
+            if db is not None:
+                db.close()
+
+    def _write(self, statements):
+        """Runs <statements> (<list> of (<sql>, <params>)) atomically."""
+        with self._db() as db, _writes.time(backend = "sqlite"):
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    db.execute(sql, params)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _migrate(self):
+        """Copies the snapshot, log and trip index of <state.State> once."""
+        data = state.load_snapshot(self._folder)
+        logPath = os.path.join(self._folder, "state.log")
+        for path in (logPath + ".old", logPath):
+            for record in journal.replay(path):
+                if record[0] > data["seq"]:
+                    state.apply(data, record)
+        tripsPath = os.path.join(self._folder, "trips.idx")
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if os.path.isfile(tripsPath):
+                    index = tripindex.TripIndex(tripsPath)
+                    try:
+                        db.executemany("INSERT OR IGNORE INTO trip_codes "
+                                       + "(trip, nick) VALUES (?, ?)",
+                                       index.pairs())
+                    finally:
+                        index.close()
+                db.executemany(
+                    "INSERT OR IGNORE INTO trip_codes (trip, nick) "
+                    + "VALUES (?, ?)",
+                    ((trip, nick)
+                     for trip, nicks in data["tripCodes"].items()
+                     for nick in nicks))
+                db.executemany(
+                    "INSERT INTO messages (recipient, sender, message) "
+                    + "VALUES (?, ?, ?)",
+                    ((recipient, msg["sender"], msg["message"])
+                     for recipient, msgs in data["messages"].items()
+                     for msg in msgs))
+                db.executemany(
+                    "INSERT OR REPLACE INTO afk VALUES (?, ?, ?)",
+                    ((channel, nick, reason)
+                     for channel, users in data["afk"].items()
+                     for nick, reason in users.items()))
+                db.execute("INSERT INTO meta VALUES ('migrated', '1')")
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def flush(self):
+        """Does nothing since every change is committed immediately."""
+
+    def close(self):
+        """Closes the idle connections."""
+        with self._lock:
+            for db in self._idle:
+                db.close()
+            self._idle = []
+
+    def afk_users(self, channel):
+        """Returns <channel>s' AFK users ({<nick>: <reason>})."""
+        with self._db() as db:
+            rows = db.execute(
+                "SELECT nick, reason FROM afk WHERE channel = ?", (channel,))
+            return dict(rows.fetchall())
+
+    def afk_among(self, channel, nicks):
+        """Returns which of <nicks> are AFK in <channel>.
+
+        Returns {<nick>: <reason>} in the order of <nicks>.
+        """
+        nicks = list(nicks)
+        if not nicks:
+            return {}
+        with self._db() as db:
+            rows = db.execute(
+                "SELECT nick, reason FROM afk WHERE channel = ? AND nick IN "
+                + "({})".format(", ".join("?" * len(nicks))),
+                [channel] + nicks)
+            afk = dict(rows.fetchall())
+        return {nick: afk[nick] for nick in nicks if nick in afk}
+
+    def set_afk(self, channel, nick, reason):
+        """Marks <nick> as AFK in <channel> with an optional <reason>."""
+        self._write([("INSERT OR REPLACE INTO afk VALUES (?, ?, ?)",
+                      (channel, nick, reason))])
+
+    def clear_afk(self, channel, nick):
+        """Removes <nick>s' AFK status in <channel>.
+
+        Returns <True> if <nick> was AFK otherwise <False>.
+        """
+        with self._db() as db:
+            cursor = db.execute("DELETE FROM afk WHERE channel = ? AND "
+                                + "nick = ?", (channel, nick))
+            return cursor.rowcount > 0
+
+    def reset_afk(self):
+        """Removes every AFK status."""
+        self._write([("DELETE FROM afk", ())])
+
+    def queue_message(self, recipient, sender, message):
+        """Saves <message> from <sender> until <recipient> is next active."""
+        self._write([("INSERT INTO messages (recipient, sender, message) "
+                      + "VALUES (?, ?, ?)", (recipient, sender, message))])
+
+    def pop_messages(self, recipient):
+        """Removes and returns the messages saved for <recipient>.
+
+        Returns a <list> of {"sender": <str>, "message": <str>}.
+        """
+        with self._db() as db:
+            if not db.execute("SELECT 1 FROM messages WHERE recipient = ?",
+                              (recipient,)).fetchone():
+                return []
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT sender, message FROM messages WHERE "
+                    + "recipient = ? ORDER BY id", (recipient,)).fetchall()
+                db.execute("DELETE FROM messages WHERE recipient = ?",
+                           (recipient,))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return [{"sender": sender, "message": message}
+                for sender, message in rows]
+
+    def log_trip_code(self, trip, nick):
+        """Records that <nick> used the trip code <trip>."""
+        with self._db() as db:
+            logged = db.execute("SELECT 1 FROM trip_codes WHERE trip = ? "
+                                + "AND nick = ?", (trip, nick)).fetchone()
+        if not logged:
+            self._write([("INSERT OR IGNORE INTO trip_codes (trip, nick) "
+                          + "VALUES (?, ?)", (trip, nick))])
+
+    def aliases(self, trip):
+        """Returns the nicks (<list>) that have used the trip code <trip>."""
+        with self._db() as db:
+            rows = db.execute("SELECT nick FROM trip_codes WHERE trip = ? "
+                              + "ORDER BY id", (trip,))
+            return [nick for nick, in rows]
+
+    def trips(self, nick):
+        """Returns the trip codes (<list>) <nick> has used."""
+        with self._db() as db:
+            rows = db.execute("SELECT trip FROM trip_codes WHERE nick = ? "
+                              + "ORDER BY id", (nick,))
+            return [trip for trip, in rows]
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+"""Runs every channel connection on a single asyncio event loop.
+
+This is an alternative to starting a thread and an <hclib.HackChat>
+connection per channel with <connections.Manager>. Set "engine" to
+"asyncio" in "config.json" to use it.
+"""
+
+import asyncio
+import json
+import re
+import traceback
+
+import websockets
+
+import connections
+import outbound
+import utility
+
+
+def translate(data):
+    """Converts the hack.chat packet <data> (<dict>) into an <hclib> event.
+
+    Returns the <dict> passed to the bots' callback or <None> if the
+    packet isn't used by the bot.
+    """
+    cmd = data.get("cmd")
+    if cmd == "chat":
+        info = {"type": "message", "nick": data["nick"],
+                "text": data["text"]}
+        if data.get("trip"):
+            info["trip"] = data["trip"]
+        return info
+    elif cmd == "onlineAdd":
+        return {"type": "online add", "nick": data["nick"]}
+    elif cmd == "onlineRemove":
+        return {"type": "online remove", "nick": data["nick"]}
+    elif cmd == "warn":
+        return {"type": "warn", "warning": data["text"]}
+    elif cmd == "info":
+        text = data.get("text", "")
+        if data.get("type") == "invite":
+            return {"type": "invite", "nick": data.get("from"),
+                    "channel": data["invite"]}
+        invite = re.match(r"(\S+) invited you to \?(\S+)", text)
+        if invite:
+            return {"type": "invite", "nick": invite.group(1),
+                    "channel": invite.group(2)}
+        stats = re.match(r"(\d+) unique IPs in (\d+) channels", text)
+        if stats:
+            return {"type": "stats", "IPs": int(stats.group(1)),
+                    "channels": int(stats.group(2))}
+    return None
+
+
+class Connection:
+    """A connection to a channel on the <Engine>s' event loop.
+
+    Has the same interface as <hclib.HackChat> used by the bot (<send>,
+    <stats>, <leave>, <channel> and <nick>). Its methods can be called
+    from any thread.
+    """
+
+    def __init__(self, engine, channel):
+        """Prepares a connection to <channel> (<str>) on <engine>."""
+        self.channel = channel
+        self.nick = engine.nick
+        self._engine = engine
+        self._outbox = asyncio.Queue()
+        self.left = False
+        self.connected = False
+
+    def _put(self, packet):
+        self._engine.loop.call_soon_threadsafe(self._outbox.put_nowait,
+                                               packet)
+
+    def send(self, text):
+        """Sends the message <text> (<str>) to the channel."""
+        self._put({"cmd": "chat", "text": text})
+
+    def stats(self):
+        """Requests the number of users and channels online."""
+        self._put({"cmd": "stats"})
+
+    def leave(self):
+        """Leaves the channel."""
+        self.left = True
+        self._put(None)
+
+    async def run(self, callback, connected=None):
+        """Stays connected until the channel is left or the socket closes.
+
+        <callback> is called with this connection and each event in a
+        thread of the loops' executor, so a slow handler only holds up
+        its own channel. <connected> is called with this connection once
+        the server has confirmed the join.
+        """
+        nick = self.nick
+        if self._engine.password:
+            nick += "#{}".format(self._engine.password)
+        async with websockets.connect(self._engine.url) as socket:
+            await socket.send(json.dumps({"cmd": "join",
+                                          "channel": self.channel,
+                                          "nick": nick}))
+            writer = asyncio.ensure_future(self._write(socket))
+            pinger = asyncio.ensure_future(self._ping(socket))
+            try:
+                async for raw in socket:
+                    data = json.loads(raw)
+                    # The users online are sent only once the join worked.
+                    if data.get("cmd") == "onlineSet" and not self.connected:
+                        self.connected = True
+                        if connected:
+                            connected(self)
+                    info = translate(data)
+                    if info:
+                        # Awaited so the channels' events stay in order.
+                        await self._engine.loop.run_in_executor(
+                            None, self._dispatch, callback, info)
+            finally:
+                writer.cancel()
+                pinger.cancel()
+
+    def _dispatch(self, callback, info):
+        try:
+            callback(self, info)
+        except Exception:
+            msg = "Handling an event from {} failed:\n{}".format(
+                self.channel, traceback.format_exc())
+            print("\n{}".format(utility.date_format("error", msg)))
+
+    async def _write(self, socket):
+        while True:
+            packet = await self._outbox.get()
+            if packet is None:
+                await socket.close()
+                return
+            await socket.send(json.dumps(packet))
+
+    async def _ping(self, socket):
+        while True:
+            await asyncio.sleep(50)
+            await socket.send(json.dumps({"cmd": "ping"}))
+
+
+class Engine:
+    """Multiplexes the connections to every channel on one event loop.
+
+    Channels are joined through a token bucket so the bot isn't
+    ratelimited and connections which drop are reconnected after a
+    <connections.Backoff> delay.
+    """
+
+    def __init__(self, nick, password, url, joinRate=0.2, joinBurst=3,
+                 backoff=None):
+        """Initializes values.
+
+        Keyword arguments:
+        nick -- <str>; the bots' name
+        password -- <str>; the password used to generate the trip code
+        url -- <str>; the websocket URL of the hack.chat instance
+        joinRate -- <float>; channels joined per second
+        joinBurst -- <int>; channels that can be joined at once
+        backoff -- <connections.Backoff>; delays between reconnecting
+        """
+        self.nick = nick
+        self.password = password
+        self.url = url
+        self.loop = asyncio.new_event_loop()
+        self._joins = outbound.TokenBucket(joinRate, joinBurst)
+        self._backoff = backoff or connections.Backoff()
+        self._callback = None
+        self._pending = None
+        self._states = {}
+        self._connections = {}
+
+    def states(self):
+        """Returns the state (<str>) of each channel ({<channel>: <str>})."""
+        return dict(self._states)
+
+    def _set_state(self, channel, state):
+        self._states[channel] = state
+        connections.report(channel, state)
+
+    def join(self, channel):
+        """Joins <channel> (<str>). It can be called from any thread."""
+        self.loop.call_soon_threadsafe(self._queue, channel)
+
+    def leave(self, channel):
+        """Leaves <channel> (<str>). It can be called from any thread."""
+        self.loop.call_soon_threadsafe(self._leave, channel)
+
+    def _queue(self, channel):
+        if self._states.get(channel, connections.LEFT) != connections.LEFT:
+            return
+        self._set_state(channel, connections.WAITING)
+        self._pending.put_nowait(channel)
+
+    def _leave(self, channel):
+        self._set_state(channel, connections.LEFT)
+        connection = self._connections.pop(channel, None)
+        if connection:
+            connection.leave()
+
+    async def _join_queued(self):
+        while True:
+            channel = await self._pending.get()
+            wait = self._joins.delay()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self._joins.delay()
+            self._joins.take()
+            if self._states.get(channel) == connections.WAITING:
+                self.loop.create_task(self._keep(channel))
+
+    async def _keep(self, channel):
+        """Stays connected to <channel> until it's left."""
+        attempt = 0
+        while True:
+            self._set_state(channel, connections.CONNECTING)
+            connection = Connection(self, channel)
+            self._connections[channel] = connection
+            try:
+                await connection.run(self._callback, self._connected)
+            except Exception as exception:
+                msg = "The connection to {} failed: {}".format(channel,
+                                                               exception)
+                print("\n{}".format(utility.date_format("warning", msg)))
+            if connection.connected:
+                attempt = 0
+            self._connections.pop(channel, None)
+            if connection.left or self._states.get(channel) == \
+                    connections.LEFT:
+                if self._states.get(channel) != connections.LEFT:
+                    self._set_state(channel, connections.LEFT)
+                return
+            self._set_state(channel, connections.RECONNECTING)
+            await asyncio.sleep(self._backoff.delay(attempt))
+            attempt += 1
+            if self._states.get(channel) == connections.LEFT:
+                return
+            wait = self._joins.delay()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self._joins.delay()
+            self._joins.take()
+
+    def _connected(self, connection):
+        self._set_state(connection.channel, connections.CONNECTED)
+
+    def run(self, callback, channels):
+        """Joins <channels> (<list>) and handles their events forever.
+
+        <callback> is called with the connection and data of each event.
+        """
+        self._callback = callback
+        asyncio.set_event_loop(self.loop)
+        self._pending = asyncio.Queue()
+        self.loop.create_task(self._join_queued())
+        for channel in channels:
+            self._queue(channel)
+        self.loop.run_forever()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""Caps replies to a character or line budget in a single pass.
+
+Every function takes the text as a <str> or as any iterable of <str>
+chunks (e.g., a header followed by a poems' lines) and reads only as
+much of it as the budget needs, so a long text costs no more to cut
+than a short one.
+"""
+
+
+def _chunks(text):
+    return (text,) if isinstance(text, str) else text
+
+
+def lines(text, limit=None):
+    """Yields the lines of <text> without their line breaks.
+
+    This splits <text> like <str.split> with "\\n" would, even across
+    chunks. If <limit> (<int>) is given and an unfinished line grows
+    past it, the line read so far is yielded and nothing else is read.
+    """
+    pending = []
+    pendingLength = 0
+    for chunk in _chunks(text):
+        start = 0
+        end = chunk.find("\n")
+        while end != -1:
+            pending.append(chunk[start:end])
+            yield "".join(pending)
+            pending = []
+            pendingLength = 0
+            start = end + 1
+            end = chunk.find("\n", start)
+        if start < len(chunk):
+            pending.append(chunk[start:])
+            pendingLength += len(chunk) - start
+            if limit is not None and pendingLength > limit:
+                yield "".join(pending)
+                return
+    yield "".join(pending)
+
+
+def truncate(text, maxLen, last):
+    """Returns <text> cut to <maxLen> characters at most.
+
+    Keyword arguments:
+    text -- <str> or iterable of <str>s; the text to shorten
+    maxLen -- <int>; the maximum number of characters to return
+    last -- <str>; if <text> is too long, it's cut after the last
+            <last> found in its first <maxLen> characters, or at
+            <maxLen> if there isn't one
+
+    Example:
+    # Gives "Hi everyone! My name is Indiana Jones."
+    truncate("Hi everyone! My name is Indiana Jones. How are you?", 45, ".")
+    """
+    kept = []
+    length = 0
+    for chunk in _chunks(text):
+        kept.append(chunk)
+        length += len(chunk)
+        if length > maxLen:
+            break
+    else:
+        return "".join(kept)
+    string = "".join(kept)[:maxLen]
+    found = string.rfind(last)
+    return string if found == -1 else string[:found + len(last)]
+
+
+def truncate_lines(text, lineLen, maxLines):
+    """Returns the whole lines of <text> fitting in <maxLines> lines.
+
+    Each line returned ends with a line break. A line longer than
+    <lineLen> characters counts as the number of lines it wraps onto.
+
+    Keyword arguments:
+    text -- <str> or iterable of <str>s; the text to shorten
+    lineLen -- <int>; the number of characters that constitute one line
+    maxLines -- <int>; the number of lines the result can be at most
+    """
+    kept = []
+    used = 0
+    for line in lines(text, lineLen * maxLines):
+        used += max(1, -(-len(line) // lineLen))
+        if used > maxLines:
+            break
+        kept.append(line)
+        kept.append("\n")
+    return "".join(kept)
+
+
+def joined(first, items, separator):
+    """Yields <first> and then <items> with <separator> between them.
+
+    This gives the chunks of <first> + <separator>.join(<items>) so the
+    joined <str> doesn't have to be built before it's cut.
+    """
+    yield first
+    for index, item in enumerate(items):
+        if index:
+            yield separator
+        yield item
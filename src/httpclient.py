@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+"""Contains the HTTP client shared by the command modules.
+
+Connections are pooled and kept alive per host, every request has a
+timeout, failed GET requests are retried with backoff and responses are
+capped in size.
+"""
+
+import codecs
+import contextlib
+import json
+import time
+import urllib.parse
+
+import loader
+import metrics
+
+requests = loader.lazy("requests")
+urllib3 = loader.lazy("urllib3")
+
+_settings = {
+    "connectTimeout": 3.05,
+    "readTimeout": 10,
+    "retries": 2,
+    "backoff": 0.3,
+    "poolSize": 10,
+    "maxBytes": 2097152,
+    "hosts": {}
+}
+_session = None
+_latency = metrics.histogram("hackchat_bot_upstream_seconds",
+                             "Seconds taken by requests to upstream APIs.",
+                             ("host",))
+_errors = metrics.counter("hackchat_bot_upstream_errors_total",
+                          "Failed requests to upstream APIs.", ("host",))
+
+
+class ResponseTooLarge(Exception):
+    """Raised when a response is larger than the configured maximum."""
+
+
+class Response:
+    """The result of a request, read in full.
+
+    Attributes:
+    url -- <str>; the URL requested
+    status_code -- <int>; the HTTP status code
+    content -- <bytes>; the body
+    text -- <str>; the body decoded
+    """
+
+    def __init__(self, url, status_code, content, encoding):
+        """Initializes values."""
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode(encoding or "utf-8", "replace")
+
+    def json(self):
+        """Returns the body parsed as JSON."""
+        return json.loads(self.text)
+
+
+def configure(settings):
+    """Changes the clients' settings.
+
+    Keyword arguments:
+    settings -- <dict>; any of the following keys
+        "connectTimeout": <float>; seconds to wait for a connection,
+        "readTimeout": <float>; seconds to wait between bytes received,
+        "retries": <int>; the number of times a failed request is retried,
+        "backoff": <float>; the backoff factor between retries,
+        "poolSize": <int>; the number of connections kept per host,
+        "maxBytes": <int>; the largest response body accepted,
+        "hosts": {<host>: <str>}; base URLs requests to each host are sent
+                 to instead (e.g., a local stub server for load tests)
+    """
+    global _session
+    _settings.update(settings)
+    _session = None
+
+
+def session():
+    """Returns the shared <requests.Session>."""
+    global _session
+    if _session is None:
+        # Only GETs are retried once sent; retrying a POST (e.g., to
+        # dpaste) after a read error could repeat it.
+        retry = urllib3.util.retry.Retry(
+            total = _settings["retries"],
+            backoff_factor = _settings["backoff"],
+            status_forcelist = (502, 503, 504),
+            allowed_methods = ("GET",))
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections = _settings["poolSize"],
+            pool_maxsize = _settings["poolSize"], max_retries = retry)
+        newSession = requests.Session()
+        newSession.mount("http://", adapter)
+        newSession.mount("https://", adapter)
+        _session = newSession
+    return _session
+
+
+class StreamedResponse:
+    """A response whose body is read only as far as it's needed.
+
+    Attributes:
+    url -- <str>; the URL requested
+    status_code -- <int>; the HTTP status code
+    encoding -- <str>; the bodys' encoding
+    """
+
+    def __init__(self, url, response):
+        """Initializes values."""
+        self.url = url
+        self.status_code = response.status_code
+        self.encoding = response.encoding or "utf-8"
+        self._response = response
+
+    def iter_content(self, size=16384):
+        """Yields the body in <bytes> chunks of up to <size> bytes.
+
+        Raises <ResponseTooLarge> once more than the "maxBytes" setting
+        has been read.
+        """
+        maxBytes = _settings["maxBytes"]
+        received = 0
+        for chunk in self._response.iter_content(size):
+            received += len(chunk)
+            if received > maxBytes:
+                raise ResponseTooLarge(
+                    "{} sent more than {} bytes".format(self.url, maxBytes))
+            yield chunk
+
+    def iter_text(self, size=16384):
+        """Yields the body decoded in <str> chunks. See <iter_content>."""
+        decoder = codecs.getincrementaldecoder(self.encoding)("replace")
+        for chunk in self.iter_content(size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", True)
+        if text:
+            yield text
+
+
+@contextlib.contextmanager
+def stream(method, url, **kwargs):
+    """Sends a request and gives its <StreamedResponse>.
+
+    Use it as a context manager; the connection is closed when it exits,
+    so a body doesn't have to be read to the end.
+
+    Example:
+    with stream("GET", "http://poetrydb.org/author/Poe") as response:
+        for chunk in response.iter_text():
+            ...
+
+    See <request> for the arguments and exceptions.
+    """
+    timeout = (_settings["connectTimeout"], _settings["readTimeout"])
+    parts = urllib.parse.urlsplit(url)
+    host = parts.hostname
+    if host in _settings["hosts"]:
+        base = _settings["hosts"][host].rstrip("/")
+        url = base + url[len("{}://{}".format(parts.scheme, parts.netloc)):]
+    start = time.perf_counter()
+    try:
+        response = session().request(method, url, timeout = timeout,
+                                     stream = True, **kwargs)
+        with response:
+            if response.status_code >= 400:
+                _errors.inc(host = host)
+            yield StreamedResponse(url, response)
+    except (requests.RequestException, ResponseTooLarge):
+        _errors.inc(host = host)
+        raise
+    finally:
+        _latency.observe(time.perf_counter() - start, host = host)
+
+
+def request(method, url, **kwargs):
+    """Sends a request and returns its <Response>.
+
+    Keyword arguments:
+    method -- <str>; the HTTP method (e.g., "GET")
+    url -- <str>; the URL
+    kwargs -- passed on to <requests.Session.request> (e.g., "headers")
+
+    Raises <ResponseTooLarge> if the body exceeds the "maxBytes" setting
+    and <requests.RequestException> if the request fails.
+    """
+    with stream(method, url, **kwargs) as response:
+        body = b"".join(response.iter_content())
+    return Response(response.url, response.status_code, body,
+                    response.encoding)
+
+
+def get(url, **kwargs):
+    """Sends a GET request. See <request>."""
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Sends a POST request. See <request>."""
+    return request("POST", url, **kwargs)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+"""Contains an append-only log used to persist the bots' state."""
+
+import json
+import os
+
+
+class Journal:
+    """Appends records to a log file, one compact JSON array per line.
+
+    Writes are buffered; call <flush> to force them to disk.
+    """
+
+    def __init__(self, path):
+        """Opens <path> (<str>) for appending, creating it if needed.
+
+        A partially written last line (e.g., from a crash) is removed so
+        that new records aren't appended to it.
+        """
+        self.path = path
+        if os.path.isfile(path):
+            _truncate_partial(path)
+        self._file = open(path, "a", encoding = "utf-8", newline = "\n")
+        self.size = self._file.tell()  # In bytes, like <append> counts.
+
+    def append(self, record):
+        """Appends <record> (<list>) to the log."""
+        line = json.dumps(record, separators = (",", ":")) + "\n"
+        self._file.write(line)
+        self.size += len(line.encode())
+
+    def flush(self):
+        """Writes buffered records to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def rotate(self, oldPath):
+        """Moves the current log to <oldPath> (<str>) and starts a new one."""
+        self.flush()
+        self._file.close()
+        os.replace(self.path, oldPath)
+        self._file = open(self.path, "a", encoding = "utf-8",
+                          newline = "\n")
+        self.size = 0
+
+    def close(self):
+        """Flushes and closes the log."""
+        self.flush()
+        self._file.close()
+
+
+def _truncate_partial(path):
+    """Cuts the file at <path> (<str>) after its last newline."""
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                pos = pos - step + newline + 1
+                break
+            pos -= step
+        if pos != end:
+            f.truncate(pos)
+
+
+def replay(path):
+    """Yields the records (<list>) saved in the log at <path> (<str>).
+
+    Nothing is yielded if <path> doesn't exist. A partially written last
+    line (e.g., from a crash) is ignored.
+    """
+    if not os.path.isfile(path):
+        return
+    with open(path, encoding = "utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
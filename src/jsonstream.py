@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+"""Parses JSON documents incrementally as they're downloaded.
+
+A <Reader> walks a document from its text chunks, so the command
+modules can take the fields they need, skip the rest without building
+it and stop reading as soon as they're done.
+
+Example:
+# Gives the first result of {"results": [...], ...}.
+reader = Reader(response.iter_text())
+for key in reader.members():
+    if key == "results":
+        for index in reader.elements():
+            return reader.value()
+"""
+
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+_string = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_plain = re.compile(r'[^"\[\]{}]+')
+_number = re.compile(r"[-+.0-9eE]+")
+
+
+class Reader:
+    """Reads one JSON document from an iterable of <str> chunks.
+
+    Values are taken in document order with <value>, <skip>, <members>
+    and <elements>. Leaving a <members> or <elements> loop early leaves
+    the reader inside that container, so only do so when nothing else
+    will be read.
+    """
+
+    def __init__(self, chunks):
+        """Initializes values."""
+        self._chunks = iter(chunks)
+        self._buffer = ""
+        self._pos = 0
+        self._ended = False
+        self._taken = 0  # The number of values started so far.
+
+    def _fill(self, minimum=1):
+        """Reads at least <minimum> more characters unless the input ends.
+
+        Returns <False> if nothing more could be read.
+        """
+        pending = [self._buffer[self._pos:]]
+        length = 0
+        while length < minimum:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._ended = True
+                break
+            pending.append(chunk)
+            length += len(chunk)
+        self._buffer = "".join(pending)
+        self._pos = 0
+        return length > 0
+
+    def _error(self, message):
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def peek(self):
+        """Returns the first character of the next token ("" at the end).
+
+        For instance, "{" means an object and "[" an array comes next.
+        """
+        while True:
+            self._pos = _whitespace.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char):
+        if self.peek() != char:
+            raise self._error("Expecting '{}'".format(char))
+        self._pos += 1
+
+    def _after(self, close):
+        """Moves past a "," and returns <True> or past <close>."""
+        char = self.peek()
+        self._pos += 1
+        if char == ",":
+            return True
+        if char == close:
+            return False
+        self._pos -= 1
+        raise self._error("Expecting ',' or '{}'".format(close))
+
+    def value(self):
+        """Returns the next value, parsed whole."""
+        self.peek()
+        found = _number.match(self._buffer, self._pos)
+        # A number running to the end of the buffer may continue.
+        while found and found.end() == len(self._buffer) and not self._ended:
+            self._fill()
+            found = _number.match(self._buffer, self._pos)
+        self._taken += 1
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._ended:
+                    raise
+            else:
+                self._pos = end
+                return value
+            self._fill(max(len(self._buffer) - self._pos, 16384))
+
+    def skip(self):
+        """Moves past the next value without building or checking it."""
+        if self.peek() not in ("{", "["):
+            self.value()
+            return
+        self._taken += 1
+        depth = 0
+        while True:
+            char = self.peek()
+            if char in ("{", "["):
+                depth += 1
+                self._pos += 1
+            elif char in ("}", "]"):
+                depth -= 1
+                self._pos += 1
+                if depth == 0:
+                    return
+            elif char == "\"":
+                found = _string.match(self._buffer, self._pos)
+                while not found:
+                    if self._ended:
+                        raise self._error("Unterminated string")
+                    self._fill(max(len(self._buffer) - self._pos, 16384))
+                    found = _string.match(self._buffer, self._pos)
+                self._pos = found.end()
+            elif char:
+                self._pos = _plain.match(self._buffer, self._pos).end()
+            else:
+                raise self._error("Unexpected end of document")
+
+    def members(self):
+        """Yields the keys (<str>) of the next value, an object.
+
+        Each members' value must be read before the next key is yielded;
+        it's skipped if it wasn't.
+        """
+        self._expect("{")
+        self._taken += 1
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != "\"":
+                raise self._error("Expecting property name")
+            key = self.value()
+            self._expect(":")
+            taken = self._taken
+            yield key
+            if self._taken == taken:
+                self.skip()
+            if not self._after("}"):
+                return
+
+    def elements(self):
+        """Yields the indexes (<int>) of the next value, an array.
+
+        Each element must be read before the next index is yielded;
+        it's skipped if it wasn't.
+        """
+        self._expect("[")
+        self._taken += 1
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            taken = self._taken
+            yield index
+            if self._taken == taken:
+                self.skip()
+            if not self._after("]"):
+                return
+            index += 1
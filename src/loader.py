@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""Loads modules on first use and times how long starting up takes.
+
+Modules wrapped with <lazy> are only imported once one of their
+attributes is used, so commands which are disabled or never called don't
+cost anything at startup.
+"""
+
+import contextlib
+import importlib
+import threading
+import time
+
+import utility
+
+# [<label>, <seconds>, <depth>] in the order they were started, where
+# <depth> is the number of <timed> steps they were nested in.
+_timings = []
+_lock = threading.RLock()
+_local = threading.local()
+
+
+def record(label, seconds):
+    """Records that <label> (<str>) took <seconds> (<float>)."""
+    with _lock:
+        _timings.append([label, seconds, getattr(_local, "depth", 0)])
+
+
+@contextlib.contextmanager
+def timed(label):
+    """Records how long the body of the "with" statement takes.
+
+    Steps timed inside the body are recorded as part of it.
+    """
+    depth = getattr(_local, "depth", 0)
+    with _lock:
+        timing = [label, None, depth]
+        _timings.append(timing)
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing[1] = time.perf_counter() - start
+        _local.depth = depth
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is used."""
+
+    def __init__(self, name):
+        """<name> (<str>) is the modules' full name (e.g., "hclib")."""
+        self._name = name
+        self._module = None
+        self._callbacks = []
+
+    def load(self):
+        """Imports the module if it hasn't been and returns it."""
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    with timed("import {}".format(self._name)):
+                        module = importlib.import_module(self._name)
+                        for callback in self._callbacks:
+                            callback(module)
+                    self._module = module
+        return self._module
+
+    def when_loaded(self, callback):
+        """Calls <callback> with the module once it's imported.
+
+        It's called straight away if the module is already imported. Use
+        it to configure modules without importing them.
+        """
+        with _lock:
+            if self._module is None:
+                self._callbacks.append(callback)
+                return
+        callback(self._module)
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        state = "loaded" if self._module else "not loaded"
+        return "<lazy module {} ({})>".format(self._name, state)
+
+
+_modules = {}
+
+
+def lazy(name):
+    """Returns the <LazyModule> for the module <name> (<str>)."""
+    with _lock:
+        if name not in _modules:
+            _modules[name] = LazyModule(name)
+        return _modules[name]
+
+
+def preload(names):
+    """Imports the modules <names> (<list>) now instead of on first use."""
+    for name in names:
+        lazy(name).load()
+
+
+def report():
+    """Returns the time each recorded step took as a <str>.
+
+    Each line is "<label>: <milliseconds> ms", in the order the steps
+    were started and indented under the step they're part of, followed
+    by the total of the outermost steps. Steps still running are left
+    out.
+    """
+    with _lock:
+        timings = [tuple(timing) for timing in _timings
+                   if timing[1] is not None]
+    lines = ["{}{}: {:.1f} ms".format("  " * depth, label, seconds * 1000)
+             for label, seconds, depth in timings]
+    total = sum(seconds for _, seconds, depth in timings if not depth)
+    lines.append("total: {:.1f} ms".format(total * 1000))
+    return "\n".join(lines)
+
+
+def print_report():
+    """Prints <report> to the console."""
+    msg = "Startup timings:\n{}".format(report())
+    print("\n{}".format(utility.date_format("info", msg)))
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+
+"""Replays chat traffic against the bot and reports how well it copes.
+
+The bot is started as a separate process connected to a <FakeServer>,
+with the APIs its commands use served by <stubs>, so nothing leaves the
+machine. Run it from the "src" folder (e.g., "python3 -m
+loadtest.driver --channels 20 --rate 50 --duration 60"); "--help" lists
+every option.
+
+Traffic is either synthetic or replayed from a file of JSON lines such
+as {"time": 1.5, "channel": "a", "nick": "ben", "text": ".toss"}, where
+"time" is the seconds since the start. "--save" writes the traffic sent
+in that format so a run can be repeated exactly.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from loadtest import server
+from loadtest import stubs
+
+_reply = re.compile(r"@([^\s,:]+)")
+_errors = {"Sorry, that didn't work.": "failed",
+           "Sorry, that took too long.": "timed out",
+           "I'm busy right now": "busy"}
+_commands = ("toss", "math {number} * {number}", "katex.rainbow.huge {word}",
+             "password {word}", "search {word}", "urban {word}", "joke",
+             "poem {word}", "define {word}", "rate:usd:inr", "help",
+             "alias {nick}")
+_chatter = ("hello everyone", "how is it going?", "@{nick} did you see that?",
+            "brb", "that's a good point @{nick}", "lol", "anyone here?")
+_words = ("sonnet", "hello", "python", "covfefe", "rain", "chat", "bot")
+
+
+def synthetic(channels, users, rate, duration, commandShare, trigger,
+              seed=None):
+    """Returns randomly generated traffic (<list> of <dict>s).
+
+    Keyword arguments:
+    channels -- <list>; the channels (<str>) messages are sent to
+    users -- <int>; the number of users chatting in each channel
+    rate -- <float>; messages per second across every channel
+    duration -- <float>; seconds of traffic
+    commandShare -- <float>; the share of messages calling the bot
+    trigger -- <str>; the bots' trigger
+    seed -- used to generate the same traffic each time
+    """
+    rng = random.Random(seed)
+    traffic = []
+    now = rng.expovariate(rate)
+    while now < duration:
+        channel = rng.choice(channels)
+        nick = "user{}".format(rng.randrange(users))
+        fill = {"nick": "user{}".format(rng.randrange(users)),
+                "number": rng.randint(1, 999), "word": rng.choice(_words)}
+        if rng.random() < commandShare:
+            text = trigger + rng.choice(_commands).format(**fill)
+        else:
+            text = rng.choice(_chatter).format(**fill)
+        traffic.append({"time": round(now, 4), "channel": channel,
+                        "nick": nick, "text": text})
+        now += rng.expovariate(rate)
+    return traffic
+
+
+def load(path):
+    """Returns the traffic (<list> of <dict>s) saved in <path>."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save(path, traffic):
+    """Saves <traffic> (<list> of <dict>s) to <path> for <load>."""
+    with open(path, "w") as f:
+        for item in traffic:
+            f.write(json.dumps(item) + "\n")
+
+
+def percentile(values, share):
+    """Returns the nearest-rank <share> (0-1) percentile of <values>."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class Run:
+    """Sends traffic through a <server.FakeServer> and times the replies.
+
+    A message calling the bot is answered by the first reply starting
+    with "@<nick>" in the same channel.
+    """
+
+    def __init__(self, fakeServer, botNick, trigger):
+        """Initializes values."""
+        self._server = fakeServer
+        self._botNick = botNick
+        self._trigger = trigger
+        self._pending = {}  # (<channel>, <nick>): [<sent time>, ...]
+        self.joined = set()
+        self.latencies = []
+        self.errors = {}
+        self.messages = 0
+        self.commands = 0
+        self.replies = 0
+        fakeServer.onChat = self._chat
+        fakeServer.onJoin = self._join
+
+    def _join(self, channel, nick):
+        if nick == self._botNick:
+            self.joined.add(channel)
+
+    def _error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def _chat(self, channel, nick, text):
+        if nick != self._botNick:
+            return
+        now = time.perf_counter()
+        self.replies += 1
+        for snippet, kind in _errors.items():
+            if snippet in text:
+                self._error(kind)
+        for line in text.split("\n"):
+            called = _reply.match(line)
+            waiting = called and self._pending.get((channel, called.group(1)))
+            if waiting:
+                self.latencies.append(now - waiting.pop(0))
+
+    async def wait_for_joins(self, channels, timeout):
+        """Waits up to <timeout> seconds for the bot to join <channels>."""
+        deadline = time.monotonic() + timeout
+        while not self.joined.issuperset(channels):
+            if time.monotonic() > deadline:
+                raise TimeoutError("The bot joined {} of {} channels".format(
+                    len(self.joined), len(channels)))
+            await asyncio.sleep(0.1)
+
+    async def replay(self, traffic, timeout):
+        """Sends <traffic> (<list> of <dict>s) on schedule.
+
+        Then waits up to <timeout> seconds for the remaining replies.
+        Returns the seconds (<float>) it took to send the traffic.
+        """
+        for channel in {item["channel"] for item in traffic}:
+            for nick in {item["nick"] for item in traffic
+                         if item["channel"] == channel}:
+                await self._server.add_user(channel, nick)
+        start = time.perf_counter()
+        for item in traffic:
+            delay = start + item["time"] - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.messages += 1
+            if item["text"].startswith(self._trigger):
+                self.commands += 1
+                self._pending.setdefault((item["channel"], item["nick"]),
+                                         []).append(time.perf_counter())
+            await self._server.say(item["channel"], item["nick"],
+                                   item["text"])
+        sent = time.perf_counter() - start
+        deadline = time.monotonic() + timeout
+        while any(self._pending.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        unanswered = sum(len(times) for times in self._pending.values())
+        if unanswered:
+            self.errors["no reply"] = unanswered
+        return sent
+
+    def report(self, sent):
+        """Returns the results (<dict>) of a run which took <sent> seconds."""
+        milliseconds = [latency * 1000 for latency in self.latencies]
+        return {
+            "seconds": round(sent, 3),
+            "messages": self.messages,
+            "commands": self.commands,
+            "replies": self.replies,
+            "answered": len(self.latencies),
+            "offeredRate": round(self.messages / sent, 2) if sent else 0,
+            "throughput": round(len(self.latencies) / sent, 2) if sent else 0,
+            "latencyMs": {
+                name: None if value is None else round(value, 2)
+                for name, value in (
+                    ("p50", percentile(milliseconds, 0.5)),
+                    ("p90", percentile(milliseconds, 0.9)),
+                    ("p99", percentile(milliseconds, 0.99)),
+                    ("max", max(milliseconds) if milliseconds else None))
+            },
+            "errors": dict(self.errors)
+        }
+
+
+def _config(args, channels, url, hosts):
+    """Returns the bots' "config.json" for a run."""
+    config = {
+        "name": "loadbot", "password": "", "channels": channels,
+        "trigger": args.trigger, "url": url, "oxfordAppId": "stub",
+        "oxfordAppKey": "stub", "exchangeRateApiKey": "stub", "github": "",
+        "doNotLeave": channels, "engine": "asyncio", "joinRate": 1000,
+        "joinBurst": len(channels), "http": {"hosts": hosts, "retries": 0},
+        "cache": {"path": None}, "metricsPort": args.metrics_port
+    }
+    if args.unpaced:
+        config["outbound"] = {"rate": 1000, "burst": 1000,
+                              "globalRate": 10000, "globalBurst": 10000}
+    if args.config:
+        with open(args.config) as f:
+            config.update(json.load(f))
+    return config
+
+
+def _print_report(results):
+    print("Sent {messages} messages ({commands} commands) in {seconds} s "
+          "({offeredRate}/s)".format(**results))
+    print("Answered {answered} commands ({throughput}/s) with {replies} "
+          "messages".format(**results))
+    latency = results["latencyMs"]
+    print("Reply latency (ms): p50 {p50}, p90 {p90}, p99 {p99}, "
+          "max {max}".format(**latency))
+    errors = ", ".join("{}: {}".format(kind, count)
+                       for kind, count in sorted(results["errors"].items()))
+    print("Errors: {}".format(errors or "none"))
+    print("Stub API requests: {}".format(results["apiRequests"]))
+
+
+async def _main(args):
+    if args.replay:
+        traffic = load(args.replay)
+    else:
+        channels = ["load{}".format(index) for index in range(args.channels)]
+        traffic = synthetic(channels, args.users, args.rate, args.duration,
+                            args.command_share, args.trigger, args.seed)
+    if args.save:
+        save(args.save, traffic)
+    channels = sorted({item["channel"] for item in traffic})
+    fakeServer = server.FakeServer()
+    await fakeServer.start()
+    stubServer = stubs.serve(delay = args.api_delay)
+    work = args.work or tempfile.mkdtemp(prefix = "hackchat-loadtest-")
+    os.makedirs(os.path.join(work, "data"), exist_ok = True)
+    config = _config(args, channels, fakeServer.url, stubs.hosts(stubServer))
+    with open(os.path.join(work, "data", "config.json"), "w") as f:
+        json.dump(config, f, indent = 4)
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    log = open(os.path.join(work, "bot.log"), "w")
+    bot = subprocess.Popen([sys.executable, os.path.join(src, "bot.py")],
+                           cwd = work, stdout = log,
+                           stderr = subprocess.STDOUT)
+    run = Run(fakeServer, config["name"], args.trigger)
+    try:
+        await run.wait_for_joins(channels, args.join_timeout)
+        sent = await run.replay(traffic, args.timeout)
+    finally:
+        bot.terminate()
+        bot.wait()
+        log.close()
+        await fakeServer.stop()
+        stubServer.shutdown()
+    results = run.report(sent)
+    results["apiRequests"] = stubServer.requests
+    if bot.returncode not in (0, -15):
+        results["errors"]["bot exited"] = bot.returncode
+    if args.json:
+        print(json.dumps(results, indent = 4))
+    else:
+        _print_report(results)
+    if args.work or args.keep:
+        print("Bot log: {}".format(os.path.join(work, "bot.log")))
+    else:
+        shutil.rmtree(work, ignore_errors = True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.split("\n")[0])
+    parser.add_argument("--channels", type = int, default = 10,
+                        help = "channels to spread synthetic traffic over")
+    parser.add_argument("--users", type = int, default = 5,
+                        help = "users chatting in each channel")
+    parser.add_argument("--rate", type = float, default = 20,
+                        help = "messages per second across every channel")
+    parser.add_argument("--duration", type = float, default = 30,
+                        help = "seconds of synthetic traffic")
+    parser.add_argument("--command-share", type = float, default = 0.5,
+                        help = "the share of messages calling the bot")
+    parser.add_argument("--seed", type = int, default = 1,
+                        help = "seed for the synthetic traffic")
+    parser.add_argument("--replay", help = "a file of traffic to replay")
+    parser.add_argument("--save", help = "a file to save the traffic to")
+    parser.add_argument("--trigger", default = ".",
+                        help = "the bots' trigger")
+    parser.add_argument("--timeout", type = float, default = 10,
+                        help = "seconds to wait for replies at the end")
+    parser.add_argument("--join-timeout", type = float, default = 30,
+                        help = "seconds to wait for the bot to join")
+    parser.add_argument("--api-delay", type = float, default = 0,
+                        help = "seconds the stub APIs take to respond")
+    parser.add_argument("--unpaced", action = "store_true",
+                        help = "lift the bots' outbound rate limits")
+    parser.add_argument("--config",
+                        help = "a JSON file overriding the bots' config")
+    parser.add_argument("--metrics-port", type = int,
+                        help = "serve the bots' metrics on this port")
+    parser.add_argument("--work", help = "the folder to run the bot in")
+    parser.add_argument("--keep", action = "store_true",
+                        help = "keep the temporary folder and bot log")
+    parser.add_argument("--json", action = "store_true",
+                        help = "print the results as JSON")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
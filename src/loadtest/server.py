@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+"""A local websocket server which speaks the hack.chat protocol.
+
+It supports the packets the bot uses ("join", "chat", "stats", "invite"
+and "ping") and sends "onlineSet", "onlineAdd", "onlineRemove", "chat",
+"info" and "warn" packets. Users can also be simulated without a socket
+using <FakeServer.say>, <FakeServer.add_user> and so on.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import time
+
+import websockets
+
+
+def trip_code(password):
+    """Returns a trip code (<str>) for <password> (<str>)."""
+    digest = hashlib.sha256(password.encode()).digest()
+    return base64.b64encode(digest).decode()[:6]
+
+
+class FakeServer:
+    """A hack.chat server running on the current asyncio event loop.
+
+    Attributes:
+    port -- <int>; the port being listened on once <start> returns
+    channels -- {<channel>: {<nick>: <websocket>}} the connected clients
+    onChat -- <function>; called with the channel, nick and text of each
+              message sent by a connected client
+    onJoin -- <function>; called with the channel and nick of each
+              connected client that joins
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        """Initializes values."""
+        self._host = host
+        self.port = port
+        self.channels = {}
+        self.onChat = None
+        self.onJoin = None
+        self._server = None
+
+    async def start(self):
+        """Starts listening."""
+        self._server = await websockets.serve(self._serve, self._host,
+                                              self.port)
+        self.port = next(iter(self._server.sockets)).getsockname()[1]
+
+    async def stop(self):
+        """Disconnects every client and stops listening."""
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def url(self):
+        """The websocket URL (<str>) clients connect to."""
+        return "ws://{}:{}".format(self._host, self.port)
+
+    async def _send(self, socket, packet):
+        packet.setdefault("time", int(time.time() * 1000))
+        try:
+            await socket.send(json.dumps(packet))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def broadcast(self, channel, packet, exclude=None):
+        """Sends <packet> (<dict>) to every client in <channel>."""
+        sockets = [socket for nick, socket in
+                   self.channels.get(channel, {}).items()
+                   if socket is not None and nick != exclude]
+        await asyncio.gather(*(self._send(socket, dict(packet))
+                               for socket in sockets))
+
+    async def say(self, channel, nick, text, trip=None):
+        """Sends <text> (<str>) to <channel> from the simulated <nick>."""
+        packet = {"cmd": "chat", "nick": nick, "text": text}
+        if trip:
+            packet["trip"] = trip
+        await self.broadcast(channel, packet)
+
+    async def add_user(self, channel, nick):
+        """Simulates <nick> (<str>) joining <channel> (<str>)."""
+        self.channels.setdefault(channel, {})[nick] = None
+        await self.broadcast(channel, {"cmd": "onlineAdd", "nick": nick},
+                             nick)
+
+    async def remove_user(self, channel, nick):
+        """Simulates <nick> (<str>) leaving <channel> (<str>)."""
+        self.channels.get(channel, {}).pop(nick, None)
+        await self.broadcast(channel, {"cmd": "onlineRemove", "nick": nick})
+
+    async def invite(self, channel, nick, target, newChannel):
+        """Simulates <nick> in <channel> inviting <target> to <newChannel>."""
+        socket = self.channels.get(channel, {}).get(target)
+        if socket is not None:
+            await self._send(socket, {
+                "cmd": "info", "type": "invite", "from": nick,
+                "invite": newChannel,
+                "text": "{} invited you to ?{}".format(nick, newChannel)})
+
+    async def warn(self, channel, text):
+        """Sends the warning <text> (<str>) to every client in <channel>."""
+        await self.broadcast(channel, {"cmd": "warn", "text": text})
+
+    async def _serve(self, socket):
+        channel = nick = trip = None
+        try:
+            async for raw in socket:
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    continue
+                cmd = data.get("cmd")
+                if cmd == "join" and channel is None:
+                    channel = data.get("channel")
+                    nick, _, password = data.get("nick", "").partition("#")
+                    users = self.channels.setdefault(channel, {})
+                    if nick in users:
+                        await self._send(socket, {
+                            "cmd": "warn", "text": "Nickname taken"})
+                        return
+                    await self._send(socket, {"cmd": "onlineSet",
+                                              "nicks": list(users) + [nick]})
+                    await self.broadcast(channel, {"cmd": "onlineAdd",
+                                                   "nick": nick})
+                    users[nick] = socket
+                    trip = trip_code(password) if password else None
+                    if self.onJoin:
+                        self.onJoin(channel, nick)
+                elif cmd == "chat" and channel is not None:
+                    text = data.get("text", "")
+                    if self.onChat:
+                        self.onChat(channel, nick, text)
+                    await self.say(channel, nick, text, trip)
+                elif cmd == "stats":
+                    clients = sum(len(users)
+                                  for users in self.channels.values())
+                    await self._send(socket, {
+                        "cmd": "info",
+                        "text": "{} unique IPs in {} channels".format(
+                            clients, len(self.channels))})
+                elif cmd == "invite" and channel is not None:
+                    await self.invite(channel, nick, data.get("nick"),
+                                      data.get("channel", "invite"))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if channel is not None and self.channels.get(
+                    channel, {}).get(nick) is socket:
+                await self.remove_user(channel, nick)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""Serves canned responses in place of the APIs the commands use.
+
+Every API is served from one local server under a path named after its
+host (e.g., "/api.duckduckgo.com/?q=..."), which is what the "hosts"
+setting of <httpclient.configure> sends requests to.
+"""
+
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+HOSTS = ("api.duckduckgo.com", "api.urbandictionary.com", "api.yomomma.info",
+         "poetrydb.org", "dpaste.com", "od-api.oxforddictionaries.com",
+         "v3.exchangerate-api.com")
+
+
+def _duckduckgo(path, query):
+    term = query.get("q", [""])[0]
+    return {"AbstractText": "{} is a stubbed search result.".format(term),
+            "AbstractSource": "Stub", "Heading": term, "Answer": "",
+            "Definition": "", "DefinitionSource": "", "DefinitionURL": "",
+            "Results": [{"FirstURL": "https://example.com/", "Text": term}]}
+
+
+def _urban(path, query):
+    term = query.get("term", [""])[0]
+    return {"result_type": "exact",
+            "list": [{"word": term,
+                      "definition": "{} is a stubbed definition.".format(term),
+                      "permalink": "https://example.com/{}".format(term)}]}
+
+
+def _yomomma(path, query):
+    return {"joke": "Yo momma is so patient she answers stubbed requests."}
+
+
+def _poetry(path, query):
+    name = urllib.parse.unquote(path.rsplit("/", 1)[-1])
+    return [{"title": name.title(), "author": "Stub Poet",
+             "lines": ["Line {} of {}".format(number, name)
+                       for number in range(1, 21)]}]
+
+
+def _oxford(path, query):
+    if "/translations=" in path:
+        sense = {"translations": [{"text": "stubbed"}]}
+    else:
+        sense = {"definitions": ["a stubbed definition"]}
+    return {"results": [{"lexicalEntries": [{"entries": [
+        {"senses": [sense]}]}]}]}
+
+
+def _exchange(path, query):
+    return {"result": "success",
+            "rates": {"USD": 1, "EUR": 0.85, "GBP": 0.75, "INR": 64,
+                      "JPY": 110}}
+
+
+_routes = {
+    "api.duckduckgo.com": _duckduckgo,
+    "api.urbandictionary.com": _urban,
+    "api.yomomma.info": _yomomma,
+    "poetrydb.org": _poetry,
+    "od-api.oxforddictionaries.com": _oxford,
+    "v3.exchangerate-api.com": _exchange
+}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        time.sleep(self.server.delay)
+        parts = urllib.parse.urlsplit(self.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        with self.server.lock:
+            self.server.requests += 1
+        if host == "dpaste.com":
+            body = "http://dpaste.com/STUB\n".encode()
+        elif host in _routes:
+            data = _routes[host]("/" + path,
+                                 urllib.parse.parse_qs(parts.query))
+            body = json.dumps(data).encode()
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, delay=0, host="127.0.0.1"):
+    """Starts the stub server in the background.
+
+    Keyword arguments:
+    port -- <int>; the port to listen on or 0 for any free port
+    delay -- <float>; seconds to wait before each response to simulate
+             a slow API
+    host -- <str>; the address to listen on
+
+    Returns the <http.server.ThreadingHTTPServer>. Its <requests>
+    attribute counts the requests served.
+    """
+    server = http.server.ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server
+
+
+def hosts(server):
+    """Returns the "hosts" setting for <httpclient> pointing at <server>."""
+    base = "http://{}:{}".format(*server.server_address[:2])
+    return {host: "{}/{}".format(base, host) for host in HOSTS}
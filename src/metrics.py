@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+"""Collects metrics about the bot and serves them over HTTP.
+
+Metrics are served in the Prometheus text format at "/metrics" on the
+port set as "metricsPort" in "config.json". Metrics are created with
+<counter>, <gauge> and <histogram>, which return the existing metric if
+one of the same name was already created. A function given for an
+existing metric is added to it, and the values of both are summed.
+"""
+
+import bisect
+import contextlib
+import http.server
+import math
+import threading
+import time
+
+import utility
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace(
+        "\n", "\\n")
+
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A metric with a value per combination of its labels' values.
+
+    Attributes:
+    name -- <str>; the name it's exported under
+    help -- <str>; what it measures
+    labels -- <tuple>; the names (<str>) of its labels
+    """
+
+    type = "untyped"
+
+    def __init__(self, name, help, labels=(), function=None):
+        """Initializes values.
+
+        Keyword arguments:
+        name -- <str>; the name it's exported under
+        help -- <str>; what it measures
+        labels -- <tuple>; the names (<str>) of its labels
+        function -- <function>; returns the values when they're collected
+                    instead of them being recorded ({(<label value>, ...):
+                    <float>})
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._functions = [function] if function else []
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def collect(self, function):
+        """Adds <function> to those its values are collected from.
+
+        The values each function returns for the same labels are summed.
+        See <__init__> for what <function> returns.
+        """
+        with self._lock:
+            self._functions.append(function)
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{{{}}}".format(",".join(
+            "{}=\"{}\"".format(name, _escape(value)) for name, value in pairs))
+
+    def values(self):
+        """Returns the current values ({(<label value>, ...): <float>})."""
+        with self._lock:
+            functions = list(self._functions)
+            if not functions:
+                return dict(self._values)
+        values = {}
+        for function in functions:
+            for key, value in function().items():
+                values[key] = values.get(key, 0) + value
+        return values
+
+    def samples(self):
+        """Returns the lines (<list>) exported for it."""
+        return ["{}{} {}".format(self.name, self._label_text(key),
+                                 _format(value))
+                for key, value in sorted(self.values().items())]
+
+    def render(self):
+        """Returns it in the Prometheus text format (<str>)."""
+        lines = ["# HELP {} {}".format(self.name, self.help),
+                 "# TYPE {} {}".format(self.name, self.type)]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    """A value which only goes up (e.g., the number of requests)."""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Adds <amount> to the value for <labels>."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value which goes up and down (e.g., a queues' length)."""
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        """Sets the value for <labels> to <value>."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """Counts observations (e.g., latencies) in buckets."""
+
+    type = "histogram"
+    defaultBuckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                      10)
+
+    def __init__(self, name, help, labels=(), buckets=defaultBuckets):
+        """Initializes values.
+
+        <buckets> are the sorted upper bounds (<float>) of the buckets.
+        The other arguments are the same as <Metric>'s.
+        """
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        """Records <value> (<float>) for <labels>."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = [[0] * len(self.buckets), 0, 0]
+            counts = self._values[key]
+            counts[0][index] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observes how long the body of the "with" statement takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            values = {key: (list(counts), total, count)
+                      for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucketCount in zip(self.buckets, counts):
+                cumulative += bucketCount
+                lines.append("{}_bucket{} {}".format(
+                    self.name, self._label_text(key, [("le", _format(bound))]),
+                    cumulative))
+            lines.append("{}_sum{} {}".format(
+                self.name, self._label_text(key), _format(total)))
+            lines.append("{}_count{} {}".format(
+                self.name, self._label_text(key), count))
+        return lines
+
+
+def _get(metricType, name, *args, **kwargs):
+    with _lock:
+        if name not in _metrics:
+            _metrics[name] = metricType(name, *args, **kwargs)
+        return _metrics[name]
+
+
+def _collected(metricType, name, help, labels, function):
+    metric = _get(metricType, name, help, labels)
+    if function:
+        metric.collect(function)
+    return metric
+
+
+def counter(name, help, labels=(), function=None):
+    """Returns the <Counter> <name>, creating it if needed."""
+    return _collected(Counter, name, help, labels, function)
+
+
+def gauge(name, help, labels=(), function=None):
+    """Returns the <Gauge> <name>, creating it if needed."""
+    return _collected(Gauge, name, help, labels, function)
+
+
+def histogram(name, help, labels=(), buckets=Histogram.defaultBuckets):
+    """Returns the <Histogram> <name>, creating it if needed."""
+    return _get(Histogram, name, help, labels, buckets)
+
+
+def render():
+    """Returns every metric in the Prometheus text format (<str>)."""
+    with _lock:
+        metrics = sorted(_metrics.values(), key = lambda metric: metric.name)
+    return "".join(metric.render() + "\n" for metric in metrics)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = render().encode()
+        except Exception as exception:
+            msg = "The metrics couldn't be collected: {}".format(exception)
+            print("\n{}".format(utility.date_format("error", msg)))
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serves the metrics at http://<host>:<port>/metrics in the background.
+
+    Returns the <http.server.ThreadingHTTPServer>.
+    """
+    server = http.server.ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    msg = "Serving metrics at http://{}:{}/metrics".format(
+        host, server.server_address[1])
+    print("\n{}".format(utility.date_format("info", msg)))
+    return server
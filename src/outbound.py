@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""Paces the messages the bot sends so it doesn't get ratelimited."""
+
+import collections
+import threading
+import time
+
+import utility
+
+# Message priorities, most urgent first.
+REPLY = 0  # Replies to commands.
+NOTICE = 1  # AFK notices.
+BULK = 2  # Deliveries of saved messages.
+
+
+class TokenBucket:
+    """Allows <rate> events per second with bursts of up to <burst>."""
+
+    def __init__(self, rate, burst):
+        """Initializes values."""
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self):
+        """Returns the seconds (<float>) until an event is allowed."""
+        self._refill()
+        return 0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self):
+        """Uses up one event."""
+        self._refill()
+        self._tokens -= 1
+
+
+class Scheduler:
+    """Sends messages through a token bucket per channel and a global one.
+
+    Messages waiting for the same connection are sent most urgent first
+    and are merged into a single message when they fit in <maxChars>.
+    The buckets are kept by channel name so a connection replacing one
+    which dropped doesn't start with a full bucket.
+    """
+
+    def __init__(self, rate=1, burst=3, globalRate=4, globalBurst=8,
+                 maxChars=704):
+        """Starts the sending thread.
+
+        Keyword arguments:
+        rate -- <float>; messages per second allowed in a channel
+        burst -- <int>; messages a channel can be sent at once
+        globalRate -- <float>; messages per second allowed overall
+        globalBurst -- <int>; messages that can be sent at once overall
+        maxChars -- <int>; the longest a merged message can be
+        """
+        self._rate = rate
+        self._burst = burst
+        self._global = TokenBucket(globalRate, globalBurst)
+        self._maxChars = maxChars
+        self._buckets = {}  # <channel>: <TokenBucket>
+        self._queues = {}  # <connection>: (<deque>, <deque>, <deque>)
+        self._condition = threading.Condition()
+        threading.Thread(target = self._run, daemon = True).start()
+
+    def send(self, connection, text, priority=REPLY):
+        """Queues <text> (<str>) to be sent over <connection>.
+
+        <priority> is one of <REPLY>, <NOTICE> or <BULK>.
+        """
+        with self._condition:
+            if connection not in self._queues:
+                self._queues[connection] = tuple(
+                    collections.deque() for _ in (REPLY, NOTICE, BULK))
+                if connection.channel not in self._buckets:
+                    self._buckets[connection.channel] = TokenBucket(
+                        self._rate, self._burst)
+            self._queues[connection][priority].append(text)
+            self._condition.notify()
+
+    def depth(self):
+        """Returns the number of messages waiting to be sent."""
+        with self._condition:
+            return sum(len(queue) for queues in self._queues.values()
+                       for queue in queues)
+
+    def forget(self, channel):
+        """Drops the messages and rate limit kept for <channel> (<str>).
+
+        Call it once the channel is left.
+        """
+        with self._condition:
+            for connection in list(self._queues):
+                if connection.channel == channel:
+                    del self._queues[connection]
+            self._buckets.pop(channel, None)
+
+    def _next(self):
+        """Returns the next (<connection>, <text>) to send or a delay.
+
+        Must be called with the lock held.
+        """
+        delay = None
+        best = None
+        for connection, queues in self._queues.items():
+            priority = next(p for p, queue in enumerate(queues) if queue)
+            wait = self._buckets[connection.channel].delay()
+            if wait:
+                delay = wait if delay is None else min(delay, wait)
+            elif best is None or priority < best[0]:
+                best = (priority, connection)
+        if best is None:
+            return delay
+        wait = self._global.delay()
+        if wait:
+            return wait
+        connection = best[1]
+        queues = self._queues[connection]
+        parts = []
+        length = -1
+        for queue in queues:
+            while queue:
+                if parts and length + 1 + len(queue[0]) > self._maxChars:
+                    break
+                parts.append(queue.popleft().rstrip("\n"))
+                length += 1 + len(parts[-1])
+            if queue:
+                break
+        del self._queues[connection]
+        if any(queues):  # Requeue it last so connections take turns.
+            self._queues[connection] = queues
+        self._buckets[connection.channel].take()
+        self._global.take()
+        return connection, "\n".join(parts)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    result = self._next() if self._queues else None
+                    if isinstance(result, tuple):
+                        break
+                    self._condition.wait(result)
+            connection, text = result
+            try:
+                connection.send(text)
+            except Exception as exception:
+                msg = "A message couldn't be sent to {}: {}".format(
+                    connection.channel, exception)
+                print("\n{}".format(utility.date_format("warning", msg)))
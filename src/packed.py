@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+"""Reads and writes the packed files memory-mapped indexes are kept in.
+
+A file starts with a header holding an 8 byte magic string, a number
+the index uses as it likes (e.g., the number of entries) and the offset
+and length of each section, then the sections themselves. Sections are
+either raw <bytes> (e.g., UTF-8 text) or little-endian <uint32> arrays,
+and start at 4 byte boundaries so arrays can be used in place.
+"""
+
+import array
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+_start = struct.Struct("<8sQI")
+_section = struct.Struct("<QQ")
+
+
+def uint32s(values):
+    """Returns <values> (iterable of <int>s) packed as <uint32>s."""
+    numbers = values if isinstance(values, array.array) else array.array(
+        "I", values)
+    if sys.byteorder == "big":
+        numbers = array.array("I", numbers)
+        numbers.byteswap()
+    return numbers.tobytes()
+
+
+def write(path, magic, value, sections, replace=os.replace):
+    """Writes a packed file to <path>, replacing it in a single rename.
+
+    Sections are streamed to the file, so they can be built from slices
+    of a mapped file and generators without being held in memory.
+
+    Keyword arguments:
+    path -- <str>; the file to write to
+    magic -- <bytes>; 8 bytes identifying the kind of file
+    value -- <int>; stored in the header for the index to use
+    sections -- <list>; the contents of each section, either bytes-like
+                or an iterable of bytes-like chunks
+    replace -- called with the temporary file written and <path> to move
+               it into place; Windows can't replace a file while it's
+               mapped, so this lets the caller unmap it first
+    """
+    headerSize = _start.size + _section.size * len(sections)
+    folder = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir = folder, prefix = ".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(headerSize))
+            layout = []
+            for section in sections:
+                f.write(bytes(-f.tell() % 4))
+                start = f.tell()
+                if isinstance(section, (bytes, bytearray, memoryview)):
+                    section = (section,)
+                for chunk in section:
+                    f.write(chunk)
+                layout.append((start, f.tell() - start))
+            # The header is written last, once the layout is known.
+            f.seek(0)
+            f.write(_start.pack(magic, value, len(sections)))
+            for start, length in layout:
+                f.write(_section.pack(start, length))
+            f.flush()
+            os.fsync(f.fileno())
+        replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class Packed:
+    """A packed file mapped into memory.
+
+    Attributes:
+    value -- <int>; the number stored in the header
+    """
+
+    def __init__(self, path, magic):
+        """Maps <path> into memory.
+
+        Raises <ValueError> if <path> doesn't start with <magic>.
+        """
+        self._path = path
+        self._reader = None
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        found, self.value, count = _start.unpack_from(self._map)
+        if found != magic:
+            self._map.close()
+            raise ValueError("{} isn't a {} file".format(path,
+                                                          magic.decode()))
+        self._views = [memoryview(self._map)]
+        self._layout = [
+            _section.unpack_from(self._map, _start.size + _section.size * i)
+            for i in range(count)]
+
+    def bytes(self, index):
+        """Returns section <index> as a <memoryview> of bytes."""
+        start, length = self._layout[index]
+        view = self._views[0][start:start + length]
+        self._views.append(view)
+        return view
+
+    def size(self, index):
+        """Returns the length in bytes (<int>) of section <index>."""
+        return self._layout[index][1]
+
+    def chunks(self, index, start=0, end=None, size=1048576):
+        """Yields section <index> from <start> to <end> as <bytes> chunks.
+
+        The chunks are read from the file rather than the mapping, so a
+        section can be copied elsewhere without it all being kept in
+        memory.
+        """
+        offset, length = self._layout[index]
+        end = length if end is None else end
+        if self._reader is None:
+            self._reader = open(self._path, "rb")
+        position = offset + start
+        while position < offset + end:
+            self._reader.seek(position)
+            chunk = self._reader.read(min(size, offset + end - position))
+            position += len(chunk)
+            yield chunk
+
+    def uint32s(self, index):
+        """Returns section <index> as a sequence of <int>s."""
+        view = self.bytes(index).cast("I")
+        self._views.append(view)
+        if sys.byteorder == "big":
+            view = array.array("I", view)
+            view.byteswap()
+        return view
+
+    def close(self):
+        """Unmaps the file. Sections returned earlier can't be used."""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
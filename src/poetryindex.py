@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+"""Searches a local copy of PoetryDB instead of poetrydb.org.
+
+The index is built once from a PoetryDB dump (a JSON array of poems, or
+one poem per line, each with a "title", "author" and "lines") and saved
+in a single file which is memory-mapped, so opening it costs nothing
+and only the pages a search touches are read. Build it from the "src"
+folder with "python3 -m poetryindex <dump> [<index>]".
+
+The file holds the poems and, for titles and for authors, a sorted
+dictionary of the lowercased words in them with the ids of the poems
+using each word, in these sections of a <packed> file:
+    records -- six <uint32>s per poem: the offsets and lengths of its
+               title, author and text in "text"
+    text -- UTF-8 encoded titles, authors and poems
+    titles, authors -- four <uint32>s per word: the offset and length
+                       of the word in "words" and the offset and count
+                       of its poem ids in "postings"
+    words -- UTF-8 encoded words, sorted by their bytes
+    postings -- <uint32> poem ids, sorted within each word
+"""
+
+import argparse
+import re
+
+import jsonstream
+import packed
+
+_magic = b"HCPOEMS1"
+_sections = ("records", "text", "titles", "authors", "words", "postings")
+_word = re.compile(r"\w+")
+
+
+def words(text):
+    """Returns the lowercased words (<list> of <str>s) in <text>."""
+    return _word.findall(text.casefold())
+
+
+def read_dump(path):
+    """Yields the poems (<dict>s) in the PoetryDB dump <path>."""
+    with open(path, encoding = "utf-8") as f:
+        reader = jsonstream.Reader(iter(lambda: f.read(65536), ""))
+        if reader.peek() == "[":
+            for index in reader.elements():
+                yield reader.value()
+        else:
+            while reader.peek():
+                yield reader.value()
+
+
+def build(poems, path):
+    """Writes an index of <poems> to <path>.
+
+    Keyword arguments:
+    poems -- iterable of <dict>s; poems from a PoetryDB dump, with
+             duplicates left out
+    path -- <str>; the file to write to, replaced in a single rename
+
+    Returns the number of poems (<int>) indexed.
+    """
+    records = []
+    text = bytearray()
+    postings = ({}, {})  # Words in titles and authors: [<poem id>, ...].
+    seen = set()
+    for poem in poems:
+        title, author = poem["title"].strip(), poem["author"].strip()
+        body = "\n".join(poem["lines"])
+        if (title, author, body) in seen:
+            continue
+        seen.add((title, author, body))
+        number = len(records)
+        record = []
+        for field in (title, author, body):
+            encoded = field.encode()
+            record += [len(text), len(encoded)]
+            text += encoded
+        records.append(record)
+        for field, index in ((title, postings[0]), (author, postings[1])):
+            for word in dict.fromkeys(words(field)):
+                index.setdefault(word, []).append(number)
+    wordBlob = bytearray()
+    offsets = {}
+    for word in sorted(set(postings[0]) | set(postings[1]),
+                       key = str.encode):
+        encoded = word.encode()
+        offsets[word] = (len(wordBlob), len(encoded))
+        wordBlob += encoded
+    ids = []
+    tables = []
+    for index in postings:
+        table = []
+        for word in sorted(index, key = str.encode):
+            table += offsets[word] + (len(ids), len(index[word]))
+            ids += index[word]
+        tables.append(packed.uint32s(table))
+    blobs = [packed.uint32s(value for record in records for value in record),
+             bytes(text), tables[0], tables[1], bytes(wordBlob),
+             packed.uint32s(ids)]
+    packed.write(path, _magic, len(records), blobs)
+    return len(records)
+
+
+def within_one_edit(first, second):
+    """Returns whether one edit turns <first> into <second> (<str>s)."""
+    if abs(len(first) - len(second)) > 1:
+        return False
+    if len(first) > len(second):
+        first, second = second, first
+    start = 0
+    while start < len(first) and first[start] == second[start]:
+        start += 1
+    if len(first) == len(second):
+        return first[start + 1:] == second[start + 1:]
+    return first[start:] == second[start + 1:]
+
+
+class PoetryIndex:
+    """A memory-mapped index built by <build>.
+
+    Attributes:
+    count -- <int>; the number of poems indexed
+    """
+
+    def __init__(self, path):
+        """Opens the index <path>.
+
+        Raises <ValueError> if <path> isn't an index.
+        """
+        self._file = packed.Packed(path, _magic)
+        self.count = self._file.value
+        self._sections = {}
+        for number, name in enumerate(_sections):
+            if name in ("text", "words"):
+                self._sections[name] = self._file.bytes(number)
+            else:
+                self._sections[name] = self._file.uint32s(number)
+
+    def close(self):
+        """Unmaps the index."""
+        self._sections = {}
+        self._file.close()
+
+    def _word(self, table, position):
+        words = self._sections["words"]
+        offset, length = table[position * 4:position * 4 + 2]
+        return bytes(words[offset:offset + length])
+
+    def _postings(self, table, position):
+        start, count = table[position * 4 + 2:position * 4 + 4]
+        return self._sections["postings"][start:start + count]
+
+    def _first(self, table, word):
+        """Returns the position of the first word >= <word> (<bytes>)."""
+        low, high = 0, len(table) // 4
+        while low < high:
+            middle = (low + high) // 2
+            if self._word(table, middle) < word:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _matches(self, table, word, prefix):
+        """Returns the ids (<set>) of poems using <word> (<str>).
+
+        Words starting with <word> match too if <prefix> is <True>. If
+        nothing matches, words one typo away from <word> are used.
+        """
+        encoded = word.encode()
+        size = len(table) // 4
+        ids = set()
+        position = self._first(table, encoded)
+        while position < size:
+            found = self._word(table, position)
+            if found != encoded and not (prefix
+                                         and found.startswith(encoded)):
+                break
+            ids.update(self._postings(table, position))
+            position += 1
+        if ids or len(word) < 4:
+            return ids
+        # Only words sharing the first letter are tried, which keeps it
+        # to a small slice of the dictionary.
+        initial = word[0].encode()
+        position = self._first(table, initial)
+        while position < size:
+            found = self._word(table, position)
+            if not found.startswith(initial):
+                break
+            if within_one_edit(found.decode(), word):
+                ids.update(self._postings(table, position))
+            position += 1
+        return ids
+
+    def search(self, query, byAuthor=False):
+        """Returns the ids (<list> of <int>s) of poems matching <query>.
+
+        A poem matches if every word of <query> (<str>) is in its title,
+        or its authors' name if <byAuthor> is <True>. The last word may
+        also be the start of a word (e.g., "raven" and "rav" both find
+        "The Raven"), and a word with one typo still matches.
+        """
+        table = self._sections["authors" if byAuthor else "titles"]
+        terms = words(query)
+        found = None
+        for number, term in enumerate(terms):
+            ids = self._matches(table, term, number == len(terms) - 1)
+            found = ids if found is None else found & ids
+            if not found:
+                return []
+        return sorted(found or ())
+
+    def poem(self, number):
+        """Returns the poem with the id <number> (<int>).
+
+        Return value:
+        {
+            "title": <str>; title of poem,
+            "author": <str>; author of poem,
+            "poem": <str>; the poem
+        }
+        """
+        records = self._sections["records"]
+        text = self._sections["text"]
+        fields = []
+        for field in range(3):
+            start, length = records[number * 6 + field * 2:
+                                    number * 6 + field * 2 + 2]
+            fields.append(str(text[start:start + length], "utf-8"))
+        return {"title": fields[0], "author": fields[1], "poem": fields[2]}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description = "Builds a poetry index from a PoetryDB dump.")
+    parser.add_argument("dump", help = "the PoetryDB dump (JSON)")
+    parser.add_argument("index", nargs = "?", default = "data/poetry.idx",
+                        help = "the index to write")
+    args = parser.parse_args()
+    count = build(read_dump(args.dump), args.index)
+    print("Indexed {} poems in {}".format(count, args.index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""Keeps the commands the bot can be called with.
+
+Commands are registered with the <command> decorator and found with a
+single dictionary lookup by <lookup>.
+"""
+
+import re
+
+_commands = {}  # Names and aliases mapped to their <Command>.
+_name = re.compile(r"[^:.]*")
+
+
+def arguments(text):
+    """Parses the "cmd:arg:arg" syntax.
+
+    <text> (<str>) is what follows the commands' name (e.g., ":usd:inr").
+    Returns the arguments (e.g., ["usd", "inr"]) or <None> if <text>
+    isn't in this syntax.
+    """
+    if not text:
+        return []
+    return text[1:].split(":") if text[0] == ":" else None
+
+
+def options(text):
+    """Parses the "cmd.opt.opt" syntax the same way <arguments> does."""
+    if not text:
+        return []
+    return text[1:].split(".") if text[0] == "." else None
+
+
+class Command:
+    """A command the bot can be called with.
+
+    Attributes:
+    name -- <str>; the name it's called with (e.g., "rate")
+    handler -- <function>; called with the bot and a <context.Context>
+    aliases -- <tuple>; other names (<str>) it can be called with
+    parser -- <function>; <arguments>, <options> or <None> if it takes
+              nothing but its name
+    requires -- <tuple>; the keys in "config.json" which must be set for
+                it to be available (e.g., API keys)
+    slow -- <bool>; <True> if it makes network requests and should be run
+            by the worker pool
+    modules -- <tuple>; the modules (<str>; e.g., "commands.katex") it
+               uses, which can be loaded when it's available
+    """
+
+    def __init__(self, name, handler, aliases=(), parser=None, requires=(),
+                 slow=False, modules=()):
+        """Initializes values."""
+        self.name = name
+        self.handler = handler
+        self.aliases = tuple(aliases)
+        self.parser = parser
+        self.requires = tuple(requires)
+        self.slow = slow
+        self.modules = tuple(modules)
+
+    def available(self, config):
+        """Returns <True> if every key it requires is set in <config>."""
+        return all(config.get(key) for key in self.requires)
+
+
+def command(name, aliases=(), parser=None, requires=(), slow=False,
+            modules=()):
+    """Decorates a function so that it handles the command <name>.
+
+    The keyword arguments are the same as <Command>'s attributes.
+    """
+    def decorator(function):
+        register(Command(name, function, aliases, parser, requires, slow,
+                         modules))
+        return function
+    return decorator
+
+
+def register(newCommand):
+    """Adds <newCommand> (<Command>) under its name and aliases.
+
+    Commands already registered under those names are replaced.
+    """
+    for name in (newCommand.name,) + newCommand.aliases:
+        _commands[name] = newCommand
+
+
+def lookup(cmd):
+    """Finds the command <cmd> (<str>; e.g., "rate:usd:inr") calls.
+
+    Returns (<Command>, <list>) of the command and its arguments or
+    (<None>, <None>) if <cmd> doesn't call a registered command.
+    """
+    name = _name.match(cmd).group()
+    found = _commands.get(name)
+    if found is None:
+        return None, None
+    rest = cmd[len(name):]
+    if found.parser is None:
+        return (found, []) if not rest else (None, None)
+    args = found.parser(rest)
+    return (found, args) if args is not None else (None, None)
+
+
+def names(config):
+    """Returns the sorted names and aliases of the available commands.
+
+    <config> (<dict>) is the bots' configuration.
+    """
+    return sorted(name for name, found in _commands.items()
+                  if found.available(config))
+
+
+def modules(config):
+    """Returns the sorted modules the available commands use.
+
+    <config> (<dict>) is the bots' configuration.
+    """
+    return sorted({module for found in _commands.values()
+                   if found.available(config) for module in found.modules})
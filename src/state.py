@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+
+"""Keeps the bots' AFK statuses, saved messages and trip codes.
+
+Every change is appended to a log ("state.log" in the "data" folder)
+which is replayed on start-up. Once the log grows past a size limit, it
+is compacted into a snapshot ("state.json") in the background, and the
+trip codes in it are added to a memory-mapped index ("trips.idx") so
+only those logged since have to be kept in memory.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+import journal
+import metrics
+import tripindex
+import utility
+
+# Log record operations. Each record is [<seq>, <operation>, *<args>].
+SET_AFK = "a"  # <channel>, <nick>, <reason>
+CLEAR_AFK = "c"  # <channel>, <nick>
+RESET_AFK = "r"
+QUEUE_MESSAGE = "m"  # <recipient>, <sender>, <message>
+DELIVER = "d"  # <recipient>
+LOG_TRIP_CODE = "t"  # <trip code>, <nick>
+
+_writes = metrics.histogram("hackchat_bot_store_write_seconds",
+                            "Seconds taken to write the store to disk.",
+                            ("backend",))
+
+
+def write_atomic(path, data):
+    """Writes <data> as JSON to <path> without ever leaving it truncated.
+
+    The JSON is written to a temporary file in the same folder which then
+    replaces <path> in a single rename.
+
+    Keyword arguments:
+    path -- <str>; the file to write to
+    data -- the JSON serializable contents
+    """
+    folder = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir = folder, prefix = ".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, separators = (",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def read_json(path):
+    """Returns the JSON in <path> or an empty <dict> if it doesn't exist."""
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_snapshot(folder):
+    """Returns the last snapshot saved in <folder> (<str>).
+
+    If no snapshot has been taken yet, the "afk.json", "messages.json"
+    and "trip_codes.json" files used by older versions are read instead.
+
+    Return value (<dict>):
+        {
+            "seq": <int>; the last log record included,
+            "afk": {<channel>: {<nick>: <reason>}},
+            "messages": {<recipient>: [{"sender": <str>,
+                                        "message": <str>}]},
+            "tripCodes": {<trip code>: [<nick>]}
+        }
+    """
+    path = os.path.join(folder, "state.json")
+    if os.path.isfile(path):
+        return read_json(path)
+    return {"seq": 0,
+            "afk": read_json(os.path.join(folder, "afk.json")),
+            "messages": read_json(os.path.join(folder, "messages.json")),
+            "tripCodes": read_json(os.path.join(folder, "trip_codes.json"))}
+
+
+def apply(data, record):
+    """Applies the log <record> (<list>) to the snapshot <data> (<dict>)."""
+    op, args = record[1], record[2:]
+    if op == SET_AFK:
+        data["afk"].setdefault(args[0], {})[args[1]] = args[2]
+    elif op == CLEAR_AFK:
+        data["afk"].get(args[0], {}).pop(args[1], None)
+    elif op == RESET_AFK:
+        data["afk"].clear()
+    elif op == QUEUE_MESSAGE:
+        data["messages"].setdefault(args[0], []).append(
+            {"sender": args[1], "message": args[2]})
+    elif op == DELIVER:
+        data["messages"].pop(args[0], None)
+    elif op == LOG_TRIP_CODE:
+        trip, nick = args
+        if nick not in data["tripCodes"].get(trip, []):
+            data["tripCodes"].setdefault(trip, []).append(nick)
+    data["seq"] = record[0]
+
+
+class State:
+    """Holds AFK statuses, saved messages and trip codes.
+
+    Every method is thread safe. Call <flush> (or <close>) to write
+    pending log records immediately.
+    """
+
+    def __init__(self, folder="data", interval=5, compactSize=4194304):
+        """Recovers the saved state and starts writing changes periodically.
+
+        Keyword arguments:
+        folder -- <str>; the folder the log and snapshot are in
+        interval -- <int>; seconds between writing log records to disk, or
+                    <0> to only write them when <flush> is called
+        compactSize -- <int>; the size in bytes after which the log is
+                       compacted into a snapshot
+        """
+        self._folder = folder
+        self._logPath = os.path.join(folder, "state.log")
+        self._oldLogPath = self._logPath + ".old"
+        self._tripsPath = os.path.join(folder, "trips.idx")
+        self._compactSize = compactSize
+        self._lock = threading.RLock()
+        self._tripIndex = None
+        self._recent = []  # [<seq>, <trip code>, <nick>] not in the index
+        self._recentNicks = {}
+        self._recentTrips = {}
+        self._known = set()  # Recently logged (<trip code>, <nick>)s.
+        if os.path.isfile(self._oldLogPath):
+            self._compact()  # A previous compaction didn't finish.
+        self._data = load_snapshot(folder)
+        if self._data["tripCodes"]:
+            self._fold_snapshot()
+        self._open_trips()
+        for record in journal.replay(self._logPath):
+            if record[0] > self._data["seq"]:
+                self._apply(record)
+        self._journal = journal.Journal(self._logPath)
+        self._compactor = None
+        self._stop = threading.Event()
+        self._flusher = None
+        if interval > 0:
+            self._flusher = threading.Thread(
+                target = self._flush_periodically, args = (interval,),
+                daemon = True)
+            self._flusher.start()
+
+    def _flush_periodically(self, interval):
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def _fold_snapshot(self):
+        """Moves the trip codes kept in the snapshot into the index.
+
+        Snapshots written by older versions hold every trip code.
+        """
+        if tripindex.sequence(self._tripsPath) < self._data["seq"]:
+            tripindex.update(self._tripsPath, (
+                (trip, nick) for trip, nicks in self._data["tripCodes"].items()
+                for nick in nicks), self._data["seq"])
+        self._data["tripCodes"] = {}
+        write_atomic(os.path.join(self._folder, "state.json"), self._data)
+
+    def _open_trips(self):
+        """Opens the trip code index and forgets the trip codes it has.
+
+        Must be called with the lock held.
+        """
+        if self._tripIndex is not None:
+            self._tripIndex.close()
+            self._tripIndex = None
+        if os.path.isfile(self._tripsPath):
+            self._tripIndex = tripindex.TripIndex(self._tripsPath)
+        seq = self._tripIndex.seq if self._tripIndex else -1
+        recent = [entry for entry in self._recent if entry[0] > seq]
+        self._recent = []
+        self._recentNicks = {}
+        self._recentTrips = {}
+        for entry in recent:
+            self._remember(*entry)
+
+    def _remember(self, seq, trip, nick):
+        self._recent.append([seq, trip, nick])
+        self._recentNicks.setdefault(trip, []).append(nick)
+        self._recentTrips.setdefault(nick, []).append(trip)
+
+    def _logged(self, trip, nick):
+        """Returns whether <nick> has used <trip>. Needs the lock held."""
+        if (trip, nick) in self._known:
+            return True
+        if nick in self._recentNicks.get(trip, ()) or (
+                self._tripIndex and self._tripIndex.contains(trip, nick)):
+            if len(self._known) >= 4096:
+                self._known.clear()
+            self._known.add((trip, nick))
+            return True
+        return False
+
+    def _apply(self, record):
+        """Applies a log record. Must be called with the lock held."""
+        if record[1] != LOG_TRIP_CODE:
+            apply(self._data, record)
+            return
+        self._data["seq"] = record[0]
+        trip, nick = record[2:]
+        if not self._logged(trip, nick):
+            self._remember(record[0], trip, nick)
+
+    def _record(self, op, *args):
+        """Applies and logs a change. Must be called with the lock held."""
+        record = [self._data["seq"] + 1, op, *args]
+        self._apply(record)
+        self._journal.append(record)
+
+    def _compact(self):
+        """Folds the rotated log into a new snapshot and trip code index."""
+        data = load_snapshot(self._folder)
+        indexSeq = tripindex.sequence(self._tripsPath)
+        pairs = []
+        if indexSeq < data["seq"]:
+            pairs = [(trip, nick)
+                     for trip, nicks in data["tripCodes"].items()
+                     for nick in nicks]
+        data["tripCodes"] = {}
+        for record in journal.replay(self._oldLogPath):
+            if record[1] == LOG_TRIP_CODE:
+                if record[0] > indexSeq:
+                    pairs.append(record[2:])
+                data["seq"] = max(data["seq"], record[0])
+            elif record[0] > data["seq"]:
+                apply(data, record)
+        tripindex.update(self._tripsPath, pairs, data["seq"],
+                         self._replace_trips)
+        write_atomic(os.path.join(self._folder, "state.json"), data)
+        os.remove(self._oldLogPath)
+
+    def _replace_trips(self, new, path):
+        """Swaps the index <path> for <new> (<str>s) and opens it.
+
+        The open index is closed first since Windows can't replace a
+        mapped file.
+        """
+        with self._lock:
+            if self._tripIndex is not None:
+                self._tripIndex.close()
+                self._tripIndex = None
+            os.replace(new, path)
+            self._open_trips()
+
+    def flush(self):
+        """Writes buffered log records to disk.
+
+        Starts compacting the log in the background if it's too large,
+        or retries compacting it if that failed last time.
+        """
+        with self._lock, _writes.time(backend = "json"):
+            self._journal.flush()
+            if self._compactor and self._compactor.is_alive():
+                return
+            # If the old log is still there the last compaction failed,
+            # and it's retried rather than rotating over the old log.
+            if not os.path.isfile(self._oldLogPath):
+                if self._journal.size < self._compactSize:
+                    return
+                self._journal.rotate(self._oldLogPath)
+            self._compactor = threading.Thread(
+                target = self._compact_in_background, daemon = True)
+            self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self._compact()
+        except Exception as exception:
+            msg = "The state log couldn't be compacted: {}".format(exception)
+            print("\n{}".format(utility.date_format("warning", msg)))
+
+    def close(self):
+        """Stops the periodic writer and writes pending log records."""
+        self._stop.set()
+        if self._compactor:
+            self._compactor.join()
+        with self._lock:
+            self._journal.close()
+            if self._tripIndex is not None:
+                self._tripIndex.close()
+                self._tripIndex = None
+
+    def afk_users(self, channel):
+        """Returns a copy of <channel>s' AFK users ({<nick>: <reason>})."""
+        with self._lock:
+            return dict(self._data["afk"].get(channel, {}))
+
+    def afk_among(self, channel, nicks):
+        """Returns which of <nicks> are AFK in <channel>.
+
+        Only <nicks> are looked up so the cost doesn't grow with the
+        number of AFK users. Returns {<nick>: <reason>} in the order of
+        <nicks>.
+        """
+        with self._lock:
+            afk = self._data["afk"].get(channel, {})
+            return {nick: afk[nick] for nick in nicks if nick in afk}
+
+    def set_afk(self, channel, nick, reason):
+        """Marks <nick> as AFK in <channel> with an optional <reason>."""
+        with self._lock:
+            self._record(SET_AFK, channel, nick, reason)
+
+    def clear_afk(self, channel, nick):
+        """Removes <nick>s' AFK status in <channel>.
+
+        Returns <True> if <nick> was AFK otherwise <False>.
+        """
+        with self._lock:
+            if nick not in self._data["afk"].get(channel, {}):
+                return False
+            self._record(CLEAR_AFK, channel, nick)
+            return True
+
+    def reset_afk(self):
+        """Removes every AFK status."""
+        with self._lock:
+            if self._data["afk"]:
+                self._record(RESET_AFK)
+
+    def queue_message(self, recipient, sender, message):
+        """Saves <message> from <sender> until <recipient> is next active."""
+        with self._lock:
+            self._record(QUEUE_MESSAGE, recipient, sender, message)
+
+    def pop_messages(self, recipient):
+        """Removes and returns the messages saved for <recipient>.
+
+        Returns a <list> of {"sender": <str>, "message": <str>}.
+        """
+        with self._lock:
+            messages = self._data["messages"].get(recipient, [])
+            if messages:
+                self._record(DELIVER, recipient)
+            return messages
+
+    def log_trip_code(self, trip, nick):
+        """Records that <nick> used the trip code <trip>."""
+        with self._lock:
+            if not self._logged(trip, nick):
+                self._record(LOG_TRIP_CODE, trip, nick)
+
+    def aliases(self, trip):
+        """Returns the nicks (<list>) that have used the trip code <trip>."""
+        with self._lock:
+            nicks = self._tripIndex.aliases(trip) if self._tripIndex else []
+            return nicks + self._recentNicks.get(trip, [])
+
+    def trips(self, nick):
+        """Returns the trip codes (<list>) <nick> has used."""
+        with self._lock:
+            trips = self._tripIndex.trips(nick) if self._tripIndex else []
+            return trips + self._recentTrips.get(nick, [])
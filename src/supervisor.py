@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""Spreads channels over several bot processes.
+
+Set "processes" in "config.json" to more than 1 to use it. Channels are
+assigned to processes by consistent hashing. AFK statuses, saved
+messages and trip codes live in a single store process shared by every
+bot process. Bot processes which crash are restarted with their
+channels. Bot process <n> serves its metrics on "metricsPort" + 1 + <n>.
+"""
+
+import bisect
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.managers
+import multiprocessing.util
+import os
+import queue
+
+import utility
+
+_store = None
+
+
+class HashRing:
+    """Assigns keys to nodes by consistent hashing."""
+
+    def __init__(self, nodes, replicas=64):
+        """Places <replicas> (<int>) points on the ring per node in <nodes>."""
+        self._points = sorted(
+            (self._hash("{}-{}".format(node, replica)), node)
+            for node in nodes for replica in range(replicas))
+        self._hashes = [point for point, _ in self._points]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+    def node(self, key):
+        """Returns the node <key> (<str>) belongs to."""
+        index = bisect.bisect(self._hashes, self._hash(key))
+        return self._points[index % len(self._points)][1]
+
+
+def _open_store(config):
+    """Opens the store in the store process."""
+    global _store
+    import database
+    import state
+    if config.get("stateBackend") == "sqlite":
+        _store = database.Database("data")
+    else:
+        _store = state.State("data", config.get("flushInterval", 5),
+                             config.get("compactSize", 4194304))
+    _store.reset_afk()
+    # Manager processes skip "atexit" handlers but run finalizers when
+    # they're shut down.
+    multiprocessing.util.Finalize(_store, _store.close, exitpriority = 10)
+
+
+def _shared_store():
+    return _store
+
+
+class StoreManager(multiprocessing.managers.BaseManager):
+    """Serves the store to the bot processes over a local socket."""
+
+
+StoreManager.register("store", callable = _shared_store)
+
+
+class ShardConnector:
+    """Joins the channels a bot process owns and forwards the rest.
+
+    Has the same <join> and <leave> methods as <connections.Manager>.
+    """
+
+    def __init__(self, manager, index, ring, routes):
+        """Initializes values.
+
+        Keyword arguments:
+        manager -- <connections.Manager>; joins this process' channels
+        index -- <int>; this process' number
+        ring -- <HashRing>; assigns channels to processes
+        routes -- <multiprocessing.Queue>; sends requests to the
+                  supervisor
+        """
+        self._manager = manager
+        self._index = index
+        self._ring = ring
+        self._routes = routes
+
+    def join(self, channel):
+        """Joins <channel> (<str>) in the process that owns it."""
+        if self._ring.node(channel) == self._index:
+            self._manager.join(channel)
+        self._routes.put(("join", channel))
+
+    def leave(self, channel):
+        """Leaves <channel> (<str>) so it's not rejoined on restarts."""
+        self._manager.leave(channel)
+        self._routes.put(("leave", channel))
+
+    def states(self):
+        """Returns the state of each of this process' channels."""
+        return self._manager.states()
+
+
+def run_worker(index, processes, channels, address, authkey, routes, inbox):
+    """Runs a bot process joined to <channels> (<list>).
+
+    Keyword arguments:
+    index -- <int>; this process' number
+    processes -- <int>; the number of bot processes
+    channels -- <list>; the channels (<str>) this process owns
+    address -- the address of the <StoreManager>
+    authkey -- <bytes>; the <StoreManager>s' key
+    routes -- <multiprocessing.Queue>; sends requests to the supervisor
+    inbox -- <multiprocessing.Queue>; receives channels to join
+    """
+    import bot
+    import connections
+    import metrics
+    config = json.loads(open("data/config.json").read())
+    if config.get("metricsPort"):
+        metrics.serve(config["metricsPort"] + 1 + index)
+    storeManager = StoreManager(address, authkey)
+    storeManager.connect()
+    manager = connections.Manager(
+        config["name"], config["password"], config["url"],
+        config.get("joinRate", 0.2), config.get("joinBurst", 3),
+        connections.Backoff(config.get("reconnectBase", 2),
+                            config.get("reconnectCap", 300)))
+    connector = ShardConnector(manager, index, HashRing(range(processes)),
+                               routes)
+    hackChatBot = bot.HackChatBot(connector, storeManager.store())
+    manager.start(hackChatBot._handle, channels)
+    while True:
+        manager.join(inbox.get())
+
+
+class Supervisor:
+    """Starts the bot processes and restarts those that crash."""
+
+    def __init__(self, config):
+        """Prepares <config["processes"]> bot processes."""
+        self._config = config
+        self._processes = config["processes"]
+        self._ring = HashRing(range(self._processes))
+        self._context = multiprocessing.get_context("spawn")
+        self._routes = self._context.Queue()
+        self._inboxes = [self._context.Queue()
+                         for _ in range(self._processes)]
+        self._shards = [[] for _ in range(self._processes)]
+        for channel in config["channels"]:
+            self._shards[self._ring.node(channel)].append(channel)
+        self._workers = [None] * self._processes
+        self._authkey = os.urandom(16)
+        self._store = None
+
+    def _start(self, index):
+        process = self._context.Process(
+            target = run_worker,
+            args = (index, self._processes, list(self._shards[index]),
+                    self._store.address, self._authkey, self._routes,
+                    self._inboxes[index]),
+            name = "bot-{}".format(index), daemon = True)
+        process.start()
+        self._workers[index] = process
+        msg = "Bot process {} started for the channels: {}".format(
+            index, ", ".join(self._shards[index]))
+        print("\n{}".format(utility.date_format("info", msg)))
+
+    def _route(self, request, channel):
+        index = self._ring.node(channel)
+        shard = self._shards[index]
+        if request == "join" and channel not in shard:
+            shard.append(channel)
+            self._inboxes[index].put(channel)
+        elif request == "leave" and channel in shard:
+            shard.remove(channel)
+
+    def run(self):
+        """Starts every process and supervises them forever."""
+        self._store = StoreManager(("127.0.0.1", 0), self._authkey,
+                                   ctx = self._context)
+        self._store.start(_open_store, (self._config,))
+        try:
+            for index in range(self._processes):
+                self._start(index)
+            while True:
+                self._supervise()
+        finally:
+            self._store.shutdown()  # Writes the stores' pending changes.
+
+    def _supervise(self):
+        """Routes a request and restarts bot processes that exited."""
+        try:
+            self._route(*self._routes.get(timeout = 1))
+        except queue.Empty:
+            pass
+        for index, process in enumerate(self._workers):
+            if process.exitcode is not None:
+                msg = "Bot process {} exited with {}; restarting it."
+                msg = msg.format(index, process.exitcode)
+                print("\n{}".format(utility.date_format("warning", msg)))
+                self._start(index)
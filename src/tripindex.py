@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+"""Looks up which nicks used which trip codes in a memory-mapped index.
+
+<state.State> moves the trip codes in its log into the index each time
+the log is compacted, so neither its start-up time nor its memory use
+grow with the history. Only the pages a lookup touches are read, and
+adding to the index copies the old one as raw bytes, touching only the
+entries of the trip codes and nicks being added.
+
+The index is a <packed> file with these sections:
+    strings -- two <uint32>s per string: the offset and length of it in
+               "text"; every trip code and nick, numbered in the order
+               they were first seen
+    text -- UTF-8 encoded strings
+    order -- the string ids sorted by the strings' bytes
+    pairs -- two <uint32>s per trip code and nick: their string ids, in
+             the order they were first seen
+    nickLists -- two <uint32>s per string: the start and count in
+                 "nicks" of the nicks that used it as a trip code
+    nicks -- string ids; a trip codes' nicks are kept together in the
+             order they were seen, and moved to the end when one is added
+    tripLists, trips -- the same for each nicks' trip codes
+"""
+
+import array
+import itertools
+import os
+import struct
+
+import packed
+
+_magic = b"HCTRIPS1"
+STRINGS, TEXT, ORDER, PAIRS, NICK_LISTS, NICKS, TRIP_LISTS, TRIPS = range(8)
+_entry = struct.Struct("<II")
+_id = struct.Struct("<I")
+
+
+class TripIndex:
+    """A memory-mapped index written by <update>.
+
+    Attributes:
+    seq -- <int>; the last log record included
+    """
+
+    def __init__(self, path):
+        """Opens the index <path>.
+
+        Raises <ValueError> if <path> isn't an index.
+        """
+        self._file = packed.Packed(path, _magic)
+        self.seq = self._file.value
+        self._strings = self._file.uint32s(STRINGS)
+        self._text = self._file.bytes(TEXT)
+        self._order = self._file.uint32s(ORDER)
+        self._pairs = self._file.uint32s(PAIRS)
+        self._lists = {NICKS: self._file.uint32s(NICK_LISTS),
+                       TRIPS: self._file.uint32s(TRIP_LISTS)}
+        self._ids = {NICKS: self._file.uint32s(NICKS),
+                     TRIPS: self._file.uint32s(TRIPS)}
+
+    def __len__(self):
+        return len(self._pairs) // 2
+
+    def close(self):
+        """Unmaps the index."""
+        self._file.close()
+
+    def _string(self, number):
+        offset, length = self._strings[number * 2:number * 2 + 2]
+        return bytes(self._text[offset:offset + length])
+
+    def _position(self, string):
+        """Returns where <string> (<bytes>) is or would be in the order."""
+        low, high = 0, len(self._order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._string(self._order[middle]) < string:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find(self, string):
+        """Returns the id (<int>) of <string> (<bytes>) or <None>."""
+        position = self._position(string)
+        if position < len(self._order):
+            number = self._order[position]
+            if self._string(number) == string:
+                return number
+        return None
+
+    def _list(self, number, section):
+        """Returns the ids paired with the string <number> (<int>)."""
+        start, count = self._lists[section][number * 2:number * 2 + 2]
+        return self._ids[section][start:start + count]
+
+    def _related(self, string, section):
+        number = self._find(string.encode())
+        if number is None:
+            return []
+        return [self._string(other).decode()
+                for other in self._list(number, section)]
+
+    def aliases(self, trip):
+        """Returns the nicks (<list>) that have used the trip code <trip>."""
+        return self._related(trip, NICKS)
+
+    def trips(self, nick):
+        """Returns the trip codes (<list>) <nick> has used."""
+        return self._related(nick, TRIPS)
+
+    def contains(self, trip, nick):
+        """Returns whether <nick> has used the trip code <trip>."""
+        nickId = self._find(nick.encode())
+        if nickId is None:
+            return False
+        tripId = self._find(trip.encode())
+        return tripId is not None and tripId in self._list(nickId, TRIPS)
+
+    def pairs(self):
+        """Yields each (<trip code>, <nick>) in the order they were seen."""
+        for index in range(0, len(self._pairs), 2):
+            trip, nick = self._pairs[index:index + 2]
+            yield self._string(trip).decode(), self._string(nick).decode()
+
+
+def sequence(path):
+    """Returns the last log record in the index <path> or -1 if none."""
+    if not os.path.isfile(path):
+        return -1
+    index = TripIndex(path)
+    try:
+        return index.seq
+    finally:
+        index.close()
+
+
+def _copied(old, section, start=0, end=None):
+    """Yields bytes <start> to <end> of <section> in <old> in chunks."""
+    if old is not None:
+        yield from old._file.chunks(section, start, end)
+
+
+def _old_list(old, key, ids):
+    """Returns the <bytes> of the old list of <key> in section <ids>."""
+    start, count = old._lists[ids][key * 2:key * 2 + 2]
+    return b"".join(old._file.chunks(ids, start * 4, (start + count) * 4))
+
+
+def _appended(old, oldCount, listed, ids, count, added):
+    """Returns the lists and ids sections with the lists added to moved.
+
+    The old sections are copied as they are, apart from the entries of
+    the moved lists, which point past their end.
+
+    Keyword arguments:
+    old -- <TripIndex>; the index being added to or <None>
+    oldCount -- <int>; the number of strings in <old>
+    listed, ids -- <int>; the sections of the lists and their ids
+    count -- <int>; the number of strings
+    added -- {<int>: [<int>]}; the ids added to each string
+    """
+    end = old._file.size(ids) // 4 if old is not None else 0
+    entries = {}
+    moved = bytearray()
+    for key, values in added.items():
+        kept = _old_list(old, key, ids) if key < oldCount else b""
+        entries[key] = _entry.pack(end + len(moved) // 4,
+                                   len(kept) // 4 + len(values))
+        moved += kept
+        moved += packed.uint32s(values)
+    lists = []
+    start = 0
+    for key in sorted(key for key in entries if key < oldCount):
+        lists += [_copied(old, listed, start, key * _entry.size),
+                  (entries[key],)]
+        start = (key + 1) * _entry.size
+    lists.append(_copied(old, listed, start))
+    empty = _entry.pack(0, 0)
+    lists.append((b"".join(entries.get(key, empty)
+                           for key in range(oldCount, count)),))
+    return (itertools.chain.from_iterable(lists),
+            itertools.chain(_copied(old, ids), (moved,)))
+
+
+def _regrouped(old, oldCount, listed, ids, count, added):
+    """Returns the lists and ids sections without moved lists' leftovers.
+
+    Both are generators reading <old> one list at a time. See
+    <_appended> for the arguments.
+    """
+
+    def lists():
+        batch = array.array("I")
+        start = 0
+        for key in range(count):
+            size = len(added.get(key, ()))
+            if key < oldCount:
+                size += old._lists[ids][key * 2 + 1]
+            batch += array.array("I", (start, size))
+            start += size
+            if len(batch) >= 16384:
+                yield packed.uint32s(batch)
+                batch = array.array("I")
+        yield packed.uint32s(batch)
+
+    def values():
+        for key in range(count):
+            if key < oldCount:
+                yield _old_list(old, key, ids)
+            if key in added:
+                yield packed.uint32s(added[key])
+
+    return lists(), values()
+
+
+def update(path, pairs, seq, replace=os.replace):
+    """Adds <pairs> to the index <path>, creating it if needed.
+
+    The old index is copied into the new one in chunks, so only what's
+    added is held in memory.
+
+    Keyword arguments:
+    path -- <str>; the index, replaced in a single rename
+    pairs -- iterable of (<trip code>, <nick>)s in the order they were
+             seen; ones already in the index are skipped
+    seq -- <int>; the last log record included
+    replace -- called with the new index and <path> to move it into
+               place (see <packed.write>)
+    """
+    old = TripIndex(path) if os.path.isfile(path) else None
+    try:
+        oldCount = len(old._strings) // 2 if old is not None else 0
+        textSize = old._file.size(TEXT) if old is not None else 0
+        strings = bytearray()
+        text = bytearray()
+        newPairs = bytearray()
+        fresh = {}  # <bytes>: <int>; strings which aren't in the index yet
+
+        def identify(string):
+            encoded = string.encode()
+            found = fresh.get(encoded)
+            if found is None and old is not None:
+                found = old._find(encoded)
+            if found is None:
+                found = fresh[encoded] = oldCount + len(fresh)
+                strings.extend(_entry.pack(textSize + len(text),
+                                           len(encoded)))
+                text.extend(encoded)
+            return found
+
+        seen = set()
+        added = {NICKS: {}, TRIPS: {}}  # <int>: [<int>]; new ids by string
+        for trip, nick in pairs:
+            if (trip, nick) in seen:
+                continue
+            seen.add((trip, nick))
+            tripId, nickId = identify(trip), identify(nick)
+            if (max(tripId, nickId) < oldCount
+                    and tripId in old._list(nickId, TRIPS)):
+                continue
+            newPairs += _entry.pack(tripId, nickId)
+            added[NICKS].setdefault(tripId, []).append(nickId)
+            added[TRIPS].setdefault(nickId, []).append(tripId)
+        # Splices the new strings into the order.
+        order = []
+        start = 0
+        for encoded in sorted(fresh):
+            position = old._position(encoded) * 4 if old is not None else 0
+            order += [_copied(old, ORDER, start, position),
+                      (_id.pack(fresh[encoded]),)]
+            start = position
+        order.append(_copied(old, ORDER, start))
+        sections = [itertools.chain(_copied(old, STRINGS), (strings,)),
+                    itertools.chain(_copied(old, TEXT), (text,)),
+                    itertools.chain.from_iterable(order),
+                    itertools.chain(_copied(old, PAIRS), (newPairs,)),
+                    None, None, None, None]
+        count = oldCount + len(fresh)
+        pairCount = len(newPairs) // _entry.size
+        if old is not None:
+            pairCount += len(old)
+        for listed, ids in ((NICK_LISTS, NICKS), (TRIP_LISTS, TRIPS)):
+            # Each list being added to is moved to the end of its section
+            # until the leftovers take up more than the lists do.
+            size = old._file.size(ids) // 4 if old is not None else 0
+            for key, values in added[ids].items():
+                size += len(values)
+                if key < oldCount:
+                    size += old._lists[ids][key * 2 + 1]
+            build = _regrouped if size > pairCount * 2 + 16384 else _appended
+            sections[listed], sections[ids] = build(old, oldCount, listed,
+                                                    ids, count, added[ids])
+
+        def swap(new, path):
+            if old is not None:
+                old.close()  # Windows can't replace a mapped file.
+            replace(new, path)
+
+        packed.write(path, _magic, seq, sections, swap)
+    finally:
+        if old is not None:
+            old.close()
@@ -3,7 +3,8 @@
 """Contains miscellaneous functions for use in the bot."""
 
 import datetime
-import re
+
+import formatting
 
 
 def date_format(title, body):
@@ -38,20 +39,7 @@ def shorten(string, maxLen, last):
     sentence = "Hi everyone! My name is Indiana Jones. How are you?"
     shortened = shorten(sentence, 45, ".")
     """
-    if len(string) <= maxLen:
-        return string
-    string = string[:maxLen]
-    incompatibilities = (".", "^", "$", "*", "+", "?", "(", ")", "[", "]", "{",
-                         "\\", "|", "-")
-    newLast = ""
-    for char in last:
-        newLast += "\\{}".format(char) if char in incompatibilities else char
-    string = string[::-1]
-    found = re.search(newLast, string)
-    if found:
-        string = string[found.start():]
-    string = string[::-1]
-    return string
+    return formatting.truncate(string, maxLen, last)
 
 
 def shorten_lines(string, lineLen, maxLines):
@@ -62,18 +50,7 @@ def shorten_lines(string, lineLen, maxLines):
     lineLen -- <int>; the number of characters that constitute one line
     maxLines -- <int>; the number of lines <string> can be at most
     """
-    lines = string.split("\n")
-    lineCount = 0
-    newLines = ""
-    for line in lines:
-        length = int(len(line) / lineLen) if len(line) > lineLen else 1
-        if len(line) > length * lineLen:
-            length += 1
-        lineCount += length
-        if lineCount > maxLines:
-            break
-        newLines += "{}\n".format(line)
-    return newLines
+    return formatting.truncate_lines(string, lineLen, maxLines)
 
 
 def identical_item(list1, list2):
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""Runs slow commands off the thread receiving messages."""
+
+import concurrent.futures
+import heapq
+import threading
+import time
+import traceback
+
+import utility
+
+
+class Pool:
+    """Runs commands on a bounded number of threads.
+
+    Commands which are still running after their timeout have their
+    replies dropped and the caller is told it took too long instead.
+    """
+
+    def __init__(self, threads=8, queueDepth=32, timeout=20, limits=None,
+                 limit=4):
+        """Starts the threads.
+
+        Keyword arguments:
+        threads -- <int>; the number of commands that can run at once
+        queueDepth -- <int>; the number of commands that can be queued or
+                      running at once before new ones are turned away
+        timeout -- <int>; seconds a command may take
+        limits -- <dict>; {<command>: <int>} the number of calls to
+                  <command> that can be queued or running at once
+        limit -- <int>; the limit for commands not in <limits>
+        """
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            threads, thread_name_prefix = "command")
+        self._queueDepth = queueDepth
+        self._timeout = timeout
+        self._limits = limits or {}
+        self._limit = limit
+        self._pending = {}
+        self._total = 0
+        self._lock = threading.Lock()
+        self._deadlines = []
+        self._watching = threading.Condition(self._lock)
+        threading.Thread(target = self._watch, daemon = True).start()
+
+    def submit(self, name, handler, ctx):
+        """Queues <handler>(<ctx>) for the command <name> (<str>).
+
+        Returns <True> if it was queued or <False> if too many commands
+        (or calls to <name>) are already waiting.
+        """
+        with self._lock:
+            pending = self._pending.get(name, 0)
+            if (self._total >= self._queueDepth
+                    or pending >= self._limits.get(name, self._limit)):
+                return False
+            self._pending[name] = pending + 1
+            self._total += 1
+            ctx.deadline = time.monotonic() + self._timeout
+            heapq.heappush(self._deadlines, (ctx.deadline, id(ctx), ctx))
+            self._watching.notify()
+        self._executor.submit(self._run, name, handler, ctx)
+        return True
+
+    def _run(self, name, handler, ctx):
+        try:
+            handler(ctx)
+        except Exception:
+            msg = "The command \"{}\" failed:\n{}".format(
+                name, traceback.format_exc())
+            print("\n{}".format(utility.date_format("error", msg)))
+            ctx.send("@{} Sorry, that didn't work.".format(ctx.nick))
+        finally:
+            with self._lock:
+                self._pending[name] -= 1
+                self._total -= 1
+                ctx.deadline = None
+
+    def _watch(self):
+        """Tells users whose commands ran past their deadline."""
+        while True:
+            expired = []
+            with self._lock:
+                while not expired:
+                    if not self._deadlines:
+                        self._watching.wait()
+                        continue
+                    deadline, _, ctx = self._deadlines[0]
+                    now = time.monotonic()
+                    if deadline > now:
+                        self._watching.wait(deadline - now)
+                        continue
+                    heapq.heappop(self._deadlines)
+                    if ctx.deadline == deadline:  # It's still running.
+                        expired.append(ctx)
+            for ctx in expired:
+                ctx.emit("@{} Sorry, that took too long.".format(ctx.nick))
+
+    def shutdown(self):
+        """Waits for the running commands to finish."""
+        self._executor.shutdown()